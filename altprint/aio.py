@@ -0,0 +1,124 @@
+import asyncio
+from altprint.printable.base import BasePrint
+from altprint.profiler import SamplingProfiler
+
+_DONE = object()
+
+
+class ProgressEvent:
+    """Progress of a pipeline stage, optionally carrying a chunk of gcode"""
+
+    def __init__(self, stage: str, index: int, total, height=None, gcode=None):
+        self.stage = stage
+        self.index = index
+        self.total = total
+        self.height = height
+        self.gcode = gcode
+
+    def __repr__(self):
+        return "ProgressEvent({}, {}/{}, height={})".format(self.stage, self.index,
+                                                          self.total, self.height)
+
+
+def _next(printable, stage, generator):
+    """Next item of a pipeline generator, profiled when the process asks for it"""
+    if not getattr(printable.process, 'profile', False):
+        return next(generator, _DONE)
+    if getattr(printable, 'profiler', None) is None:
+        printable.profiler = SamplingProfiler()
+    with printable.profiler.stage(stage):
+        item = next(generator, _DONE)
+    if item is _DONE:
+        printable.profiler.write(printable.process.profile_output)
+    return item
+
+
+async def _step(loop, executor, printable, stage, generator):
+    return await loop.run_in_executor(executor, _next, printable, stage, generator)
+
+
+def _check_exportable(printable: BasePrint):
+    if not hasattr(printable.process, 'gcode_exporter'):
+        raise TypeError("{} can not be exported asynchronously, its process has no gcode_exporter".format(type(printable).__name__)) # noqa: E501
+
+
+async def aslice(printable: BasePrint, executor=None):
+    """Slices the printable in the executor"""
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(executor, printable.slice)
+
+
+async def iter_layers(printable: BasePrint, executor=None):
+    """
+    Generates the layers in the executor, one layer per job.
+
+    Yields a 'layer' ProgressEvent after each layer. Cancelling the consuming
+    task stops the generation before the next layer starts.
+    """
+    loop = asyncio.get_running_loop()
+    heights = getattr(printable, 'heights', None)
+    total = len(heights) if heights else None
+    layers = printable.iter_layers()
+    index = 0
+    while True:
+        item = await _step(loop, executor, printable, 'make_layers', layers)
+        if item is _DONE:
+            break
+        yield ProgressEvent('layer', index, total, height=item[0])
+        index += 1
+
+
+async def iter_gcode(printable: BasePrint, executor=None):
+    """
+    Generates the gcode in the executor, one layer per job.
+
+    Yields 'gcode' ProgressEvents whose gcode attribute holds the start
+    script, each layer and the end script, in order.
+    """
+    _check_exportable(printable)
+    loop = asyncio.get_running_loop()
+    gcode_exporter = printable.make_exporter()
+    heights = list(printable.layers.keys())
+    total = len(heights) + 2
+    chunks = gcode_exporter.iter_gcode(printable)
+    index = 0
+    while True:
+        chunk = await _step(loop, executor, printable, 'export_gcode', chunks)
+        if chunk is _DONE:
+            break
+        height = heights[index - 1] if 0 < index <= len(heights) else None
+        yield ProgressEvent('gcode', index, total, height=height, gcode=chunk)
+        index += 1
+
+
+async def run(printable: BasePrint, filename=None, executor=None):
+    """
+    Runs slice, layer generation and gcode generation without blocking.
+
+    Yields a 'slice' event, then the 'layer' and 'gcode' events. When
+    filename is given the gcode is also written to it.
+
+    ARGS:
+    printable: object to be printed (BasePrint)
+    filename: output gcode file (default None) (str)
+    executor: executor running the stages (default loop executor)
+    """
+    _check_exportable(printable)
+    loop = asyncio.get_running_loop()
+    await aslice(printable, executor)
+    yield ProgressEvent('slice', 0, 1)
+    async for event in iter_layers(printable, executor):
+        yield event
+    if filename is None:
+        async for event in iter_gcode(printable, executor):
+            yield event
+        return
+    if printable.process.verbose is True:
+        print("exporting gcode to {}".format(filename))
+    f = await loop.run_in_executor(executor, open, filename, 'w')
+    try:
+        async for event in iter_gcode(printable, executor):
+            await loop.run_in_executor(executor, f.write, event.gcode)
+            yield event
+    finally:
+        f.close()
@@ -0,0 +1,162 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import numpy as np
+from altprint.gcode import GcodeCache
+
+# process settings that do not change the generated layers
+_IGNORED_SETTINGS = ["verbose", "checkpoint_dir", "checkpoint_every", "gcode_cache",
+                     "export_processes", "profile", "profile_output",
+                     "start_script", "end_script", "gcode_exporter"]
+
+_PLAIN = (int, float, str, bool, type(None))
+# attributes left out of the description of objects
+_SKIPPED_ATTRIBUTES = ["model"]
+
+
+def _describe(value):
+    """
+    Stable description of a setting value.
+
+    Raises ValueError for values that can not be told apart by their
+    description, like lambdas, so two jobs never share a checkpoint by mistake.
+    """
+    if isinstance(value, _PLAIN):
+        return value
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_describe(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _describe(v) for k, v in sorted(value.items())}
+    if isinstance(value, functools.partial):
+        return {"partial": _describe(value.func), "args": _describe(value.args),
+                "keywords": _describe(value.keywords)}
+    if isinstance(value, type) or inspect.isroutine(value):
+        name = value.__module__ + "." + value.__qualname__
+        if "<" in name:
+            raise ValueError("{} can not be checkpointed, use a module level function, a class or functools.partial".format(name)) # noqa: E501
+        return name
+    if not hasattr(value, "__dict__"):
+        raise ValueError("{!r} can not be checkpointed".format(value))
+    description = {"type": _describe(type(value))}
+    for k, v in sorted(vars(value).items()):
+        if not k.startswith("_") and k not in _SKIPPED_ATTRIBUTES:
+            description[k] = _describe(v)
+    return description
+
+
+def file_hash(filename) -> str:
+    h = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(2**20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class Checkpoint:
+    """
+    Persists the finished layers of a printable so an interrupted job can
+    resume from its last saved layer.
+
+    Layers are pickled in chunks of every layers next to a manifest holding
+    the job key, a hash of the process settings, model files and slicing
+    heights. A checkpoint whose key does not match the job is discarded.
+    """
+
+    def __init__(self, directory: str, key: str, every: int = 10):
+        self.directory = directory
+        self.key = key
+        self.every = every
+        self.chunks: list[str] = []
+        self._pending = []
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def for_print(cls, printable):
+        """Checkpoint of a printable, None when its process has none set"""
+        process = printable.process
+        if getattr(process, "checkpoint_dir", None) is None:
+            return None
+        settings = {}
+        for k, v in sorted(vars(process).items()):
+            if k in _IGNORED_SETTINGS:
+                continue
+            try:
+                settings[k] = _describe(v)
+            except ValueError as error:
+                raise ValueError("setting {}: {}".format(k, error)) from None
+        models = [getattr(process, "model_file", ""),
+                  getattr(process, "flex_model_file", "")]
+        models += [o["model_file"] for o in getattr(process, "override_models", [])]
+        job = {"settings": settings,
+               "models": [file_hash(m) for m in models if m],
+               "heights": [float(h) for h in printable.heights]}
+        key = hashlib.sha256(json.dumps(job, sort_keys=True).encode()).hexdigest()
+        return cls(process.checkpoint_dir, key,
+                   getattr(process, "checkpoint_every", 10))
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, "manifest.json")
+
+    def _write_atomic(self, filename, data: bytes):
+        path = os.path.join(self.directory, filename)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+
+    def load(self) -> dict:
+        """
+        Layers saved by a previous run of the same job.
+
+        RETURNS:
+        Saved layers by height, empty if there is no valid checkpoint (dict)
+        """
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("key") != self.key:
+            self.clear(manifest.get("chunks", []))
+            return {}
+        layers = {}
+        for chunk in manifest["chunks"]:
+            with open(os.path.join(self.directory, chunk), "rb") as f:
+                layers.update(pickle.load(f))
+        self.chunks = list(manifest["chunks"])
+        return layers
+
+    def clear(self, chunks):
+        for chunk in chunks:
+            path = os.path.join(self.directory, chunk)
+            if os.path.exists(path):
+                os.remove(path)
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+        self.chunks = []
+
+    def save_layer(self, height, layer):
+        """Queues a finished layer, writing the queue every self.every layers"""
+        self._pending.append((height, layer))
+        if len(self._pending) >= self.every:
+            self.flush()
+
+    def flush(self):
+        """Writes the queued layers and updates the manifest"""
+        if not self._pending:
+            return
+        chunk = "layers_{:05d}.pkl".format(len(self.chunks))
+        self._write_atomic(chunk, pickle.dumps(dict(self._pending)))
+        self.chunks.append(chunk)
+        self._pending = []
+        manifest = {"key": self.key, "chunks": self.chunks}
+        self._write_atomic("manifest.json", json.dumps(manifest).encode())
+
+    def gcode_cache(self) -> GcodeCache:
+        """Cache keeping every gcode fragment in the checkpoint directory"""
+        return GcodeCache(spill_dir=os.path.join(self.directory, "gcode"),
+                          write_through=True)
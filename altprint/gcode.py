@@ -1,16 +1,88 @@
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import chain
+import copy
+import hashlib
+import os
+import pickle
 from shapely.geometry import LineString
 from altprint.printable.base import BasePrint
 import numpy as np
 
+
+class GcodeCache:
+    """
+    Bounded LRU cache of per layer gcode fragments.
+
+    Fragments evicted from memory are written to spill_dir when it is set,
+    and read back from there on a later miss. With write_through every
+    fragment is written to spill_dir as soon as it is stored.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 2**20, spill_dir=None,
+                 write_through: bool = False):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.write_through = write_through
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._fragments = OrderedDict()
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def _spill_path(self, key):
+        return os.path.join(self.spill_dir, key + '.pkl')
+
+    def _spill(self, key, value):
+        path = self._spill_path(key)
+        if not os.path.exists(path):
+            with open(path + '.tmp', 'wb') as f:
+                pickle.dump(value, f)
+            os.replace(path + '.tmp', path)
+
+    def get(self, key):
+        if key in self._fragments:
+            self._fragments.move_to_end(key)
+            self.hits += 1
+            return self._fragments[key]
+        if self.spill_dir is not None and os.path.exists(self._spill_path(key)):
+            with open(self._spill_path(key), 'rb') as f:
+                value = pickle.load(f)
+            self.hits += 1
+            self.put(key, value)
+            return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        if key in self._fragments:
+            self.size -= len(self._fragments.pop(key)[0])
+        self._fragments[key] = value
+        self.size += len(value[0])
+        if self.spill_dir is not None and self.write_through:
+            self._spill(key, value)
+        while self.size > self.max_bytes and len(self._fragments) > 1:
+            old_key, old_value = self._fragments.popitem(last=False)
+            self.size -= len(old_value[0])
+            if self.spill_dir is not None:
+                self._spill(old_key, old_value)
+
+    def clear(self):
+        self._fragments.clear()
+        self.size = 0
+
+
 class GcodeExporter:
 
-    def __init__(self, start_script = '', end_script = ''):
+    def __init__(self, start_script = '', end_script = '', cache: GcodeCache = None):
         self.gcode_content: list[str] = []
         self.head_x: float = 0.0
         self.head_y: float = 0.0
         self.min_jump: float = 1
         self.start_script_fname = start_script
         self.end_script_fname = end_script
+        self.cache = cache
 
     def segment(self, x, y, z, e, v) -> str:
         segment = []
@@ -24,7 +96,7 @@ class GcodeExporter:
         actual_speed = v[0]
         for i in range(len(x)-1):
             if actual_speed != v[i+1]:
-                segment.append('G1 X{0:.3f} Y{1:.3f} E{2:.4f} F{1:.3f} \n'.format(x[i+1], y[i+1], e[i+1], )) # noqa: E501
+                segment.append('G1 X{0:.3f} Y{1:.3f} E{2:.4f} F{3:.3f} \n'.format(x[i+1], y[i+1], e[i+1], v[i+1])) # noqa: E501
                 actual_speed = v[i+1]
             else:
                 segment.append('G1 X{0:.3f} Y{1:.3f} E{2:.4f} \n'.format(x[i+1], y[i+1], e[i+1])) # noqa: E501
@@ -51,53 +123,152 @@ class GcodeExporter:
             script = ''.join(script)
         return script
 
-    def make_gcode(self, printable: BasePrint):
+    def iter_gcode(self, printable: BasePrint):
+        """Generates the gcode, yielding the start script, each layer and the end script""" # noqa: E501
 
-        self.gcode_content = []
-        start_script = self.read_script(self.start_script_fname)
-        end_script = self.read_script(self.end_script_fname)
-        self.gcode_content.append(start_script)
+        yield self.read_script(self.start_script_fname)
 
         for z, layer in printable.layers.items():
-            for raster in layer.perimeter:
-                x, y = raster.path.xy
-                x, y = np.array(x), np.array(y)
-                if LineString([(self.head_x, self.head_y), (x[0], y[0])]).length > self.min_jump: # noqa: E501
-                    self.gcode_content.append(self.jump(x[0], y[0]))
-                self.head_x, self.head_y = x[-1], y[-1]
-                self.gcode_content.append(self.segment(x, y, z, raster.extrusion, raster.speed)) # noqa: E501
-
-            for raster in layer.infill:
-                x, y = raster.path.xy
-                x, y = np.array(x), np.array(y)
-                if LineString([(self.head_x, self.head_y), (x[0], y[0])]).length > self.min_jump: # noqa: E501
-                    self.gcode_content.append(self.jump(x[0], y[0]))
-                self.head_x, self.head_y = x[-1], y[-1]
-                self.gcode_content.append(self.segment(x, y, z, raster.extrusion, raster.speed)) # noqa: E501
-
-        self.gcode_content.append(end_script)
+            yield self.layer_gcode(layer, z)
 
-    def make_layer_gcode(self, layer):
-        layer_gcode = []
-        for raster in layer.perimeter:
-            x, y = raster.path.xy
-            x, y = np.array(x), np.array(y)
-            if LineString([(self.head_x, self.head_y), (x[0], y[0])]).length > self.min_jump: # noqa: E501
-                layer_gcode.append(self.jump(x[0], y[0]))
-            self.head_x, self.head_y = x[-1], y[-1]
-            layer_gcode.append(self.segment(x, y, None, raster.extrusion, raster.speed))
+        yield self.read_script(self.end_script_fname)
 
-        for raster in layer.infill:
+    def make_gcode(self, printable: BasePrint):
+        self.gcode_content = list(self.iter_gcode(printable))
+
+    def needs_jump(self, x, y) -> bool:
+        return LineString([(self.head_x, self.head_y), (x, y)]).length > self.min_jump
+
+    def layer_paths(self, layer) -> list:
+        """x, y, extrusion and speed arrays of each raster of a layer"""
+        paths = []
+        for raster in chain(layer.skirt, layer.perimeter, layer.infill):
             x, y = raster.path.xy
-            x, y = np.array(x), np.array(y)
-            if LineString([(self.head_x, self.head_y), (x[0], y[0])]).length > self.min_jump: # noqa: E501
-                layer_gcode.append(self.jump(x[0], y[0]))
+            paths.append((np.array(x), np.array(y), raster.extrusion, raster.speed))
+        return paths
+
+    def path_blocks(self, paths, z=None) -> list[str]:
+        """Gcode blocks of a list of paths, starting from the current head position"""
+        blocks = []
+        for x, y, e, v in paths:
+            if self.needs_jump(x[0], y[0]):
+                blocks.append(self.jump(x[0], y[0]))
             self.head_x, self.head_y = x[-1], y[-1]
-            layer_gcode.append(self.segment(x, y, None, raster.extrusion, raster.speed))
+            blocks.append(self.segment(x, y, z, e, v))
+        return blocks
+
+    def layer_blocks(self, layer, z=None) -> list[str]:
+        """Gcode blocks of a layer, starting from the current head position"""
+        return self.path_blocks(self.layer_paths(layer), z)
+
+    def layer_key(self, layer, z=None, standalone: bool = False) -> str:
+        """
+        Hash of everything the gcode of a layer depends on: the exporter class,
+        the layer toolpath arrays, its height and whether the head has to jump
+        to the first raster.
+
+        With standalone, the key of the layer gcode formatted as if the head
+        already stood on its first raster, as the parallel export does.
+        """
+        h = hashlib.blake2b(digest_size=20)
+        h.update(repr((type(self).__module__, type(self).__qualname__,
+                       z, self.min_jump)).encode())
+        first = True
+        for raster in chain(layer.skirt, layer.perimeter, layer.infill):
+            coords = np.asarray(raster.path.coords, dtype=float)
+            if first:
+                if standalone:
+                    h.update(b'S')
+                else:
+                    h.update(b'J' if self.needs_jump(*coords[0][:2]) else b'N')
+                first = False
+            h.update(coords.tobytes())
+            h.update(np.asarray(raster.extrusion, dtype=float).tobytes())
+            h.update(np.asarray(raster.speed, dtype=float).tobytes())
+        if first and not standalone:
+            h.update(repr((self.head_x, self.head_y)).encode())
+        return h.hexdigest()
+
+    def layer_gcode(self, layer, z=None) -> str:
+        """Gcode of a layer, reused from the cache when the layer is unchanged"""
+        if self.cache is None:
+            return "".join(self.layer_blocks(layer, z))
+        key = self.layer_key(layer, z)
+        cached = self.cache.get(key)
+        if cached is None:
+            gcode = "".join(self.layer_blocks(layer, z))
+            self.cache.put(key, (gcode, (self.head_x, self.head_y)))
+            return gcode
+        gcode, (self.head_x, self.head_y) = cached
+        return gcode
 
-        return layer_gcode
+    def make_layer_gcode(self, layer):
+        return [self.layer_gcode(layer)]
 
     def export_gcode(self, filename):
         with open(filename, 'w') as f:
             for gcode_block in self.gcode_content:
                 f.write(gcode_block)
+
+    def export_gcode_parallel(self, printable: BasePrint, filename, processes=None):
+        """
+        Formats the layers in worker processes and writes them to the file as
+        they are finished.
+
+        Workers format each layer as if the head already stood on its first
+        raster. The jumps between layers, which only depend on the head
+        position, are stitched in layer order while writing. At most a few
+        layers per worker are in flight at a time, so the bodies never all sit
+        in memory. Layers found in the cache are not sent to the workers.
+
+        ARGS:
+        printable: object to be exported (BasePrint)
+        filename: output gcode file (str)
+        processes: number of worker processes (default: number of cpus) (int)
+        """
+        # workers format with a copy of this exporter, so subclasses and their
+        # settings apply, but without its cache and content
+        template = copy.copy(self)
+        template.cache = None
+        template.gcode_content = []
+        window = 4 * (processes or os.cpu_count() or 1)
+        pending = deque()
+        with open(filename, 'wb') as f, ProcessPoolExecutor(processes) as pool:
+            f.write(self.read_script(self.start_script_fname).encode())
+            for z, layer in printable.layers.items():
+                paths = self.layer_paths(layer)
+                key = body = None
+                if self.cache is not None:
+                    key = self.layer_key(layer, z, standalone=True)
+                    cached = self.cache.get(key)
+                    if cached is not None:
+                        body = cached[0].encode()
+                if body is None:
+                    body = pool.submit(_format_layer, (template, z, paths))
+                pending.append((key, paths, body))
+                if len(pending) >= window:
+                    self._write_layer(f, *pending.popleft())
+            while pending:
+                self._write_layer(f, *pending.popleft())
+            f.write(self.read_script(self.end_script_fname).encode())
+
+    def _write_layer(self, f, key, paths, body):
+        """Writes a layer body formatted by a worker, after the jump to its start"""
+        if isinstance(body, Future):
+            body = body.result()
+            if self.cache is not None:
+                self.cache.put(key, (body.decode(), None))
+        if paths:
+            x, y = paths[0][0], paths[0][1]
+            if self.needs_jump(x[0], y[0]):
+                f.write(self.jump(x[0], y[0]).encode())
+            self.head_x, self.head_y = paths[-1][0][-1], paths[-1][1][-1]
+        f.write(body)
+
+
+def _format_layer(job) -> bytes:
+    """Formats the paths of a layer with an exporter, starting on its first raster"""
+    exporter, z, paths = job
+    if paths:
+        exporter.head_x, exporter.head_y = paths[0][0][0], paths[0][1][0]
+    return "".join(exporter.path_blocks(paths, z)).encode()
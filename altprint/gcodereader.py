@@ -0,0 +1,227 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+WORDS = "XYZEF"
+MARKER = b'; ALTPRINT'
+NUMBER_WIDTH = 20
+
+
+def _to_float(values) -> np.ndarray:
+    """
+    Parses the decimal number at the start of each row of a (n, width) bytes
+    array, nan where there is none.
+
+    Digits are accumulated into an integer mantissa that is divided by a power
+    of ten once, which rounds the same way as float().
+    """
+    n, width = values.shape
+    mantissa = np.zeros(n, dtype=np.int64)
+    decimals = np.zeros(n, dtype=np.int64)
+    has_digits = np.zeros(n, dtype=bool)
+    after_dot = np.zeros(n, dtype=bool)
+    running = np.ones(n, dtype=bool)
+    negative = values[:, 0] == ord('-')
+    signed = negative | (values[:, 0] == ord('+'))
+    for j in range(width):
+        column = values[:, j]
+        digit = column - ord('0')
+        is_digit = running & (digit < 10)
+        is_dot = running & (column == ord('.')) & ~after_dot
+        running = is_digit | is_dot | ((j == 0) & signed)
+        mantissa = np.where(is_digit, mantissa*10 + digit, mantissa)
+        decimals += is_digit & after_dot
+        has_digits |= is_digit
+        after_dot |= is_dot
+        if not running.any():
+            break
+    result = mantissa / 10.0**decimals
+    result[negative] = -result[negative]
+    result[~has_digits] = np.nan
+    return result
+
+
+def find_markers(data: bytes) -> list:
+    """(start, end) offsets of the ALTPRINT marker lines of a piece of gcode"""
+    markers = []
+    start = data.find(MARKER)
+    while start >= 0:
+        end = data.find(b'\n', start)
+        end = len(data) if end < 0 else end + 1
+        if start == 0 or data[start - 1] == ord('\n'):
+            markers.append((start, end))
+        start = data.find(MARKER, end)
+    return markers
+
+
+def marker_height(line: bytes) -> float:
+    """Height written as the last word of a marker line"""
+    return float(line.split(b' ')[-1])
+
+
+def iter_chunks(filename, chunk_size: int = 2**24, start: int = 0, end=None):
+    """
+    Reads the bytes start:end of a file in pieces of about chunk_size bytes
+    that end at a line break.
+    """
+    with open(filename, 'rb') as f:
+        if end is None:
+            end = f.seek(0, os.SEEK_END)
+        f.seek(start)
+        position = start
+        rest = b''
+        while position < end:
+            data = f.read(min(chunk_size, end - position))
+            if not data:
+                break
+            position += len(data)
+            data = rest + data
+            cut = data.rfind(b'\n') + 1
+            if cut == 0:
+                rest = data
+                continue
+            rest = data[cut:]
+            yield data[:cut]
+        if rest:
+            yield rest
+
+
+def byte_ranges(filename, parts: int) -> list:
+    """Splits a file in up to parts (start, end) byte ranges at line breaks"""
+    size = os.path.getsize(filename)
+    bounds = [0]
+    with open(filename, 'rb') as f:
+        for k in range(1, parts):
+            f.seek(max(k * size // parts, bounds[-1]))
+            f.readline()
+            bounds.append(min(f.tell(), size))
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def parse_chunk(data: bytes):
+    """
+    Parses the moves and markers of a piece of gcode made of whole lines.
+
+    Lines are found from the positions of the line breaks, and the words of
+    all the moves are located and converted at once for each letter.
+
+    RETURNS:
+    x, y, z, e, f words of each move, nan where missing ((n, 5) array),
+    number of markers found before each move ((n,) array) and
+    marker heights ((m,) array)
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf == ord('\n'))
+    if len(buf) and buf[-1] != ord('\n'):
+        ends = np.append(ends, len(buf))
+    starts = np.concatenate([[0], ends[:-1] + 1]).astype(np.int64)
+    padded = np.concatenate([buf, np.zeros(NUMBER_WIDTH, dtype=np.uint8)])
+    windows = sliding_window_view(padded, NUMBER_WIDTH)
+    head = windows[starts, :3]
+    is_move = ((head[:, 0] == ord('G')) & np.isin(head[:, 1], list(b'01'))
+               & np.isin(head[:, 2], list(b' \t')))
+    # commands end at the first semicolon of the line
+    semicolons = np.flatnonzero(buf == ord(';'))
+    first = np.searchsorted(semicolons, starts)
+    cut = np.minimum(np.append(semicolons, len(buf))[first], ends)
+    move_index = np.cumsum(is_move) - 1
+    moves = np.full((int(is_move.sum()), len(WORDS)), np.nan)
+    for i, w in enumerate(WORDS):
+        positions = np.flatnonzero(buf == ord(w))
+        line = np.searchsorted(ends, positions)
+        keep = is_move[line] & (positions < cut[line])
+        positions, line = positions[keep], line[keep]
+        moves[move_index[line], i] = _to_float(windows[positions + 1])
+    markers = find_markers(data)
+    marker_starts = np.array([start for start, _ in markers], dtype=np.int64)
+    seen = np.searchsorted(marker_starts, starts[is_move])
+    heights = np.array([marker_height(data[a:b]) for a, b in markers], dtype=float)
+    return moves, seen, heights
+
+
+def _parse_range(job):
+    filename, start, end, chunk_size = job
+    return [parse_chunk(data) for data in iter_chunks(filename, chunk_size, start, end)] # noqa: E501
+
+
+class GcodeMoves:
+    """
+    Moves and ALTPRINT markers of a gcode file as arrays.
+
+    moves holds the X, Y, Z, E and F words of every G0/G1 move, nan where a
+    word is missing. layer holds, for each move, the index in heights of the
+    last marker before it, -1 for the moves before the first marker.
+    """
+
+    def __init__(self, moves: np.ndarray, layer: np.ndarray, heights: np.ndarray):
+        self.moves = moves
+        self.layer = layer
+        self.heights = heights
+
+    def __len__(self):
+        return len(self.moves)
+
+    def positions(self) -> np.ndarray:
+        """Moves with each missing word carried over from the previous move"""
+        index = np.where(np.isnan(self.moves), 0, np.arange(len(self.moves))[:, None])
+        np.maximum.accumulate(index, axis=0, out=index)
+        return self.moves[index, np.arange(self.moves.shape[1])]
+
+    def layer_moves(self, i: int) -> np.ndarray:
+        """Moves between the i-th marker and the next one"""
+        return self.moves[self.layer == i]
+
+
+def read_gcode(filename, chunk_size: int = 2**24, processes: int = 1) -> GcodeMoves:
+    """
+    Reads the moves and markers of a gcode file.
+
+    ARGS:
+    filename: gcode file (str)
+    chunk_size: bytes parsed at a time (int)
+    processes: number of worker processes, each parsing a byte range of the
+               file (default: 1, parse in this process) (int)
+
+    RETURNS:
+    Moves of the file (GcodeMoves)
+    """
+    if processes == 1:
+        chunks = [parse_chunk(data) for data in iter_chunks(filename, chunk_size)]
+    else:
+        jobs = [(filename, start, end, chunk_size)
+                for start, end in byte_ranges(filename, processes or os.cpu_count() or 1)] # noqa: E501
+        with ProcessPoolExecutor(processes) as pool:
+            chunks = [chunk for result in pool.map(_parse_range, jobs) for chunk in result] # noqa: E501
+    moves, layer, heights = [np.empty((0, 5))], [np.empty(0, dtype=np.int64)], [np.empty(0)] # noqa: E501
+    markers = 0
+    for chunk_moves, chunk_seen, chunk_heights in chunks:
+        moves.append(chunk_moves)
+        layer.append(chunk_seen + markers - 1)
+        heights.append(chunk_heights)
+        markers += len(chunk_heights)
+    return GcodeMoves(np.concatenate(moves), np.concatenate(layer), np.concatenate(heights)) # noqa: E501
+
+
+def read_markers(filename, chunk_size: int = 2**24):
+    """
+    Finds the ALTPRINT markers of a gcode file.
+
+    RETURNS:
+    Marker heights and the byte offset right after each marker line
+    (array, array)
+    """
+    heights, ends = [], []
+    offset = 0
+    for data in iter_chunks(filename, chunk_size):
+        for start, end in find_markers(data):
+            heights.append(marker_height(data[start:end]))
+            ends.append(offset + end)
+        offset += len(data)
+    return np.array(heights, dtype=float), np.array(ends, dtype=np.int64)
+
+
+def read_heights(filename, chunk_size: int = 2**24) -> list[float]:
+    """Heights of the ALTPRINT markers of a gcode file"""
+    return read_markers(filename, chunk_size)[0].tolist()
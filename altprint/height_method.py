@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
 import numpy as np
+from altprint.gcodereader import read_heights
 
 
 class HeightMethod(ABC):
@@ -33,13 +34,7 @@ class CopyHeightsFromFileMethod(HeightMethod):
         self.gcode_file_name = gcode_file_name
 
     def get_heights(self, bounds=None) -> list[float]:
-        heights = []
-        with open(self.gcode_file_name, "r") as f:
-            lines = f.readlines()
-        for line in lines:
-            if line.startswith("; ALTPRINT"):
-                heights.append(float(line.split(' ')[-1]))
-        return heights
+        return read_heights(self.gcode_file_name)
 
 if __name__ == "__main__":
     cp = CopyHeightsFromFileMethod("teste.gcode")
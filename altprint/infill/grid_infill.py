@@ -0,0 +1,7 @@
+from altprint.infill.pattern_infill import PatternInfill
+
+
+class GridInfill(PatternInfill):
+    """Two families of parallel lines crossing at right angles"""
+
+    families = (0, 90)
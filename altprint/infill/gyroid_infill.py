@@ -0,0 +1,73 @@
+import numpy as np
+from shapely.geometry import MultiLineString
+from altprint.infill.pattern_infill import PatternInfill, cached_pattern
+from altprint.layer import Layer
+
+
+def gyroid_curves(period, z, extent):
+    """
+    Section of the gyroid surface sin(x)cos(y) + sin(y)cos(z) + sin(z)cos(x) = 0
+    at height z, covering [-extent, extent]².
+
+    The section is solved for y as a function of x where |cos(z)| >= |sin(z)|
+    and for x as a function of y elsewhere, so every curve is continuous.
+
+    ARGS:
+    period: gyroid period (float)
+    z: section height (float)
+    extent: half size of the covered square (float)
+
+    RETURNS:
+    Curves array (array)
+    """
+    s = 2*np.pi/period
+    zs = z*s
+    step = period/12
+    n = int(np.ceil(extent/step))
+    t = np.arange(-n, n+1)*step
+    ts = t*s
+    swap = np.cos(2*zs) < 0
+    if not swap:
+        # cos(z)sin(y) + sin(x)cos(y) = -sin(z)cos(x), cos(z) keeps its sign
+        a, b, c = np.cos(zs), np.sin(ts), -np.sin(zs)*np.cos(ts)
+        r = np.sqrt(a**2 + b**2)
+        base = np.arcsin(np.clip(np.sign(a)*c/r, -1, 1))
+        psi = np.arctan(b/a)
+        branches = np.stack([base - psi, np.pi - base - psi])
+    else:
+        # cos(y)sin(x) + sin(z)cos(x) = -sin(y)cos(z), sin(z) keeps its sign
+        a, b, c = np.cos(ts), np.sin(zs), -np.sin(ts)*np.cos(zs)
+        r = np.sqrt(a**2 + b**2)
+        base = np.arccos(np.clip(np.sign(b)*c/r, -1, 1))
+        psi = np.arctan(a/b)
+        branches = np.stack([psi + base, psi - base])
+
+    k = np.arange(-int(np.ceil(extent/period))-1, int(np.ceil(extent/period))+2)
+    v = (branches[None, :, :] + 2*np.pi*k[:, None, None]).reshape(-1, len(t))/s
+    curves = np.empty((len(v), len(t), 2))
+    curves[:, :, 0 if swap else 1] = v
+    curves[:, :, 1 if swap else 0] = t
+    return curves
+
+
+class GyroidInfill(PatternInfill):
+    """Planar sections of a gyroid, changing smoothly with the layer height"""
+
+    height_dependent = True
+
+    def spacing(self, gap):
+        return 2 * gap / self.density
+
+    def pattern(self, layer: Layer, gap, extent):
+        period = self.spacing(gap)
+        z = round(layer.height % period, 3)
+        key = ('gyroid', round(period, 6), z)
+        return cached_pattern(key, extent, lambda e: gyroid_curves(period, z, e))
+
+    def generate_infill(self, layer: Layer, gap, angle) -> MultiLineString:
+        """
+        Clips the gyroid section at the layer height. The angle is ignored, a
+        rotated section would not belong to the same surface as the layers
+        around it.
+        """
+        return super().generate_infill(layer, gap, 0)
@@ -4,6 +4,9 @@ from altprint.layer import Layer
 
 class InfillMethod(ABC):
 
+    # whether the infill changes with the layer height for the same border
+    height_dependent = False
+
     @abstractmethod
     def generate_infill(self, layer: Layer) -> MultiLineString:
         pass
@@ -0,0 +1,121 @@
+import threading
+from shapely.geometry import LineString, MultiLineString
+from shapely.affinity import rotate
+import numpy as np
+from altprint.infill.infill import InfillMethod
+from altprint.layer import Layer
+
+_pattern_cache = {}
+_max_patterns = 64
+_pattern_lock = threading.Lock()
+
+
+def cached_pattern(key, extent, build):
+    """
+    Returns pattern curves covering the square [-extent, extent]².
+
+    Curves are anchored at the origin, so they line up between layers, and
+    cached by key. They are rebuilt with build(extent) only when the cached
+    ones do not cover the requested extent.
+
+    ARGS:
+    key: pattern identifier (hashable)
+    extent: half size of the square to be covered (float)
+    build: function returning a (curves, points, 2) array for an extent
+
+    RETURNS:
+    Curves array and their bounding boxes (array, array)
+    """
+    with _pattern_lock:
+        cached = _pattern_cache.get(key)
+    if cached is None or cached[0] < extent:
+        if cached is not None:
+            extent = max(extent, 2*cached[0])
+        curves = build(extent)
+        bboxes = np.concatenate([curves.min(axis=1), curves.max(axis=1)], axis=1)
+        cached = (extent, curves, bboxes)
+        with _pattern_lock:
+            _pattern_cache.pop(key, None)
+            if len(_pattern_cache) >= _max_patterns:
+                del _pattern_cache[next(iter(_pattern_cache))]
+            _pattern_cache[key] = cached
+    return cached[1], cached[2]
+
+
+def parallel_lines(spacing, extent):
+    """Horizontal lines spaced by spacing, covering [-extent, extent]²"""
+    n = int(np.ceil(extent/spacing))
+    ys = np.arange(-n, n+1)*spacing
+    lines = np.empty((len(ys), 2, 2))
+    lines[:, 0, 0] = -extent
+    lines[:, 1, 0] = extent
+    lines[:, 0, 1] = ys
+    lines[:, 1, 1] = ys
+    return lines
+
+
+def clip_curves(curves, bboxes, shape):
+    """
+    Clips all the pattern curves against a shape in a single operation.
+
+    Curves whose bounding box misses the shape are culled beforehand.
+
+    RETURNS:
+    Clipped paths, with alternating direction (list of LineString)
+    """
+    minx, miny, maxx, maxy = shape.bounds
+    mask = ((bboxes[:, 0] <= maxx) & (bboxes[:, 2] >= minx)
+            & (bboxes[:, 1] <= maxy) & (bboxes[:, 3] >= miny))
+    selected = curves[mask]
+    if not len(selected):
+        return []
+    clipped = shape.intersection(MultiLineString([c for c in selected]))
+    if isinstance(clipped, LineString):
+        parts = [clipped]
+    else:
+        parts = [g for g in getattr(clipped, 'geoms', []) if isinstance(g, LineString)]
+    paths = []
+    for i, part in enumerate(parts):
+        if part.length == 0:
+            continue
+        if i % 2:
+            part = LineString(part.coords[::-1])
+        paths.append(part)
+    return paths
+
+
+class PatternInfill(InfillMethod):
+    """
+    Base class for the infills made by clipping a periodic pattern.
+
+    Each family of curves is clipped in a frame rotated by its angle, so the
+    cached pattern does not depend on the infill angle.
+    """
+
+    families = (0,)
+
+    def __init__(self, density: float = 0.2):
+        self.density = density
+
+    def spacing(self, gap):
+        """Distance between the curves of one family for the desired density"""
+        return gap * len(self.families) / self.density
+
+    def pattern(self, layer: Layer, gap, extent):
+        key = ('lines', round(self.spacing(gap), 6))
+        return cached_pattern(key, extent,
+                              lambda e: parallel_lines(self.spacing(gap), e))
+
+    def generate_infill(self, layer: Layer, gap, angle) -> MultiLineString:
+        infill = []
+        for family_angle in self.families:
+            a = angle + family_angle
+            for border in layer.infill_border.geoms:
+                r_border = rotate(border, a, origin=(0, 0))
+                extent = np.abs(r_border.bounds).max() + self.spacing(gap)
+                curves, bboxes = self.pattern(layer, gap, extent)
+                paths = clip_curves(curves, bboxes, r_border)
+                if paths:
+                    paths = rotate(MultiLineString(paths), -a, origin=(0, 0))
+                    infill.extend(paths.geoms)
+        return MultiLineString(infill)
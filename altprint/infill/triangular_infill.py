@@ -0,0 +1,7 @@
+from altprint.infill.pattern_infill import PatternInfill
+
+
+class TriangularInfill(PatternInfill):
+    """Three families of parallel lines at 60 degrees, forming triangles"""
+
+    families = (0, 60, 120)
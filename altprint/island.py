@@ -0,0 +1,148 @@
+from collections import OrderedDict
+from shapely.geometry import MultiPolygon, MultiLineString
+import numpy as np
+from altprint.layer import Layer
+from altprint.layerstore import LayerStore
+
+
+class Island:
+    """A connected region of a layer, with an identity kept across heights"""
+
+    def __init__(self, island_id: int, shape, height: float):
+        self.id = island_id
+        self.shape = shape
+        self.height = height
+        self.bounds = shape.bounds
+
+
+def bounds_overlap(bounds, box) -> np.ndarray:
+    """Mask of the (n, 4) bounds array entries that overlap box"""
+    bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+    return ((bounds[:, 0] <= box[2]) & (bounds[:, 2] >= box[0])
+            & (bounds[:, 1] <= box[3]) & (bounds[:, 3] >= box[1]))
+
+
+class IslandIndex:
+    """
+    Islands of every layer of a print.
+
+    An island takes the identity of the island of the layer below it that it
+    overlaps the most, so parts can be followed along the height. Perimeters
+    and infill are generated island by island and cached by island geometry,
+    so identical islands on different layers are only computed once.
+
+    Islands are visited in nearest neighbour order, starting from the last
+    island visited on the layer below.
+    """
+
+    def __init__(self, max_cached: int = 256):
+        self.layers = LayerStore()
+        self.next_id = 0
+        self.max_cached = max_cached
+        self.hits = 0
+        self.position = (0.0, 0.0)
+        self._cache = OrderedDict()
+
+    def add_layer(self, height, shape) -> list[Island]:
+        polygons = list(shape.geoms) if shape else []
+        below = self.layers.below(height)
+        previous = below[1] if below else []
+        previous_bounds = [island.bounds for island in previous]
+        islands = []
+        taken = set()
+        for polygon in polygons:
+            best, best_area = None, 0.0
+            for j in np.flatnonzero(bounds_overlap(previous_bounds, polygon.bounds)):
+                if previous[j].id in taken:
+                    continue
+                area = previous[j].shape.intersection(polygon).area
+                if area > best_area:
+                    best, best_area = previous[j].id, area
+            if best is None:
+                best = self.next_id
+                self.next_id += 1
+            taken.add(best)
+            islands.append(Island(best, polygon, height))
+        self.layers[height] = islands
+        return islands
+
+    def islands(self, height) -> list[Island]:
+        return self.layers.get(height, [])
+
+    def query(self, height, box) -> list[Island]:
+        """Islands of a layer whose bounding box overlaps box"""
+        islands = self.islands(height)
+        mask = bounds_overlap([island.bounds for island in islands], box)
+        return [island for island, inside in zip(islands, mask) if inside]
+
+    def track(self, island_id) -> list[Island]:
+        """Every layer's island with the given identity, bottom to top"""
+        return [island for islands in self.layers.values()
+                for island in islands if island.id == island_id]
+
+    def ordered(self, islands, start=(0.0, 0.0)) -> list[Island]:
+        """Islands in nearest neighbour order of their bounding box centers"""
+        remaining = list(islands)
+        ordered = []
+        position = np.asarray(start, dtype=float)
+        while remaining:
+            centers = np.array([[(i.bounds[0] + i.bounds[2])/2, (i.bounds[1] + i.bounds[3])/2] # noqa: E501
+                                for i in remaining])
+            k = int(np.argmin(np.hypot(*(centers - position).T)))
+            position = centers[k]
+            ordered.append(remaining.pop(k))
+        return ordered
+
+    def travel(self, islands) -> list[Island]:
+        """
+        Islands of a layer in the order they are printed, starting from where
+        the previous layer ended. Moves the position to the last of them.
+        """
+        ordered = self.ordered(islands, self.position)
+        if ordered:
+            bounds = ordered[-1].bounds
+            self.position = ((bounds[0] + bounds[2])/2, (bounds[1] + bounds[3])/2)
+        return ordered
+
+    def cached(self, key, compute):
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return self._cache[key]
+        value = compute()
+        self._cache[key] = value
+        if len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+        return value
+
+    def make_paths(self, layer: Layer, islands, infill_method, gap, angle) -> MultiLineString: # noqa: E501
+        """
+        Generates the perimeters, infill border and infill of a layer island by
+        island, in travel order.
+
+        Sets the layer's perimeter_paths and infill_border and returns its
+        infill paths.
+        """
+        method_key = (type(infill_method).__name__, repr(sorted(vars(infill_method).items()))) # noqa: E501
+        if getattr(infill_method, 'height_dependent', False):
+            method_key = method_key + (layer.height,)
+        perimeter, border, infill = [], [], []
+        for island in self.travel(islands):
+            def compute():
+                sub = Layer(MultiPolygon([island.shape]), layer.perimeter_num,
+                            layer.perimeter_gap, layer.external_adjust,
+                            layer.overlap, layer.height)
+                sub.make_perimeter()
+                sub.make_infill_border()
+                paths = infill_method.generate_infill(sub, gap, angle)
+                return (list(sub.perimeter_paths.geoms), list(sub.infill_border.geoms),
+                        list(paths.geoms))
+            key = (island.shape.wkb, layer.perimeter_num, layer.perimeter_gap,
+                   layer.external_adjust, layer.overlap, gap, angle, method_key)
+            island_perimeter, island_border, island_infill = self.cached(key, compute)
+            perimeter.extend(island_perimeter)
+            border.extend(island_border)
+            infill.extend(island_infill)
+        layer.perimeter_paths = MultiLineString(perimeter)
+        layer.infill_border = MultiPolygon(border)
+        return MultiLineString(infill)
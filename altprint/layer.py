@@ -7,26 +7,39 @@ class Raster:
     def __init__(self, path: LineString, flow, speed):
 
         self.path = path
+        self.set_profile(speed, flow)
 
-        self.speed = np.ones(len(path.coords)) * speed
-        self.extrusion = np.zeros(len(path.coords))
-        x, y = path.xy
-        for i in range(1, len(path.coords)):
-            dx = abs(x[i] - x[i - 1])
-            dy = abs(y[i] - y[i - 1])
-            self.extrusion[i] = np.sqrt((dx**2) + (dy**2)) * flow * calculate() + self.extrusion[i-1] # noqa: E501
+    def set_profile(self, speed, flow):
+        """
+        Sets the speed and flow of the raster and recomputes its extrusion.
+
+        ARGS:
+        speed: speed, for the whole raster or for each vertex (float or array)
+        flow: flow, for the whole raster or for each vertex (float or array)
+        """
+        coords = np.asarray(self.path.coords)
+        self.speed = np.ones(len(coords)) * speed
+        self.flow = np.ones(len(coords)) * flow
+        self.extrusion = np.zeros(len(coords))
+        if len(coords) > 1:
+            dx = np.abs(np.diff(coords[:, 0]))
+            dy = np.abs(np.diff(coords[:, 1]))
+            lengths = np.sqrt((dx**2) + (dy**2))
+            self.extrusion[1:] = np.cumsum(lengths * self.flow[1:] * calculate())
 
 
 class Layer:
     """Layer Object that stores layer internal and external shapes, also perimeters and infill path""" # noqa: E501
 
-    def __init__(self, shape: MultiPolygon, perimeter_num, perimeter_gap, external_adjust, overlap): # noqa: E501
+    def __init__(self, shape: MultiPolygon, perimeter_num, perimeter_gap, external_adjust, overlap, height=0.0): # noqa: E501
         self.shape = shape
+        self.height = height
         self.perimeter_num = perimeter_num
         self.perimeter_gap = perimeter_gap
         self.external_adjust = external_adjust
         self.overlap = overlap
         self.perimeter_paths: List = [] #noqa: F821
+        self.skirt: List = [] #noqa: F821
         self.perimeter: List = [] #noqa: F821
         self.infill: List = [] #noqa: F821
         self.infill_border: MultiPolygon = MultiPolygon()
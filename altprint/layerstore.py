@@ -0,0 +1,127 @@
+from bisect import bisect_left, bisect_right
+import numpy as np
+
+
+class LayerStore:
+    """
+    Height keyed container that keeps its entries sorted by height.
+
+    Lookups are binary searches that accept any height within the tolerance
+    of a stored one, so heights parsed from text or computed by different
+    parts still find their layer. It can be used in place of the
+    dict[float, Layer] the printables used to hold.
+    """
+
+    def __init__(self, items=None, tolerance: float = 1e-4):
+        self.tolerance = tolerance
+        self._heights: list[float] = []
+        self._values: list = []
+        if items is not None:
+            if hasattr(items, 'items'):
+                items = items.items()
+            for height, value in items:
+                self[height] = value
+
+    def _find(self, height):
+        """Index of the stored height closest to height, None if none is within tolerance""" # noqa: E501
+        i = bisect_left(self._heights, height - self.tolerance)
+        best = None
+        while i < len(self._heights) and self._heights[i] <= height + self.tolerance:
+            if best is None or abs(self._heights[i] - height) < abs(self._heights[best] - height): # noqa: E501
+                best = i
+            i += 1
+        return best
+
+    def __getitem__(self, height):
+        i = self._find(height)
+        if i is None:
+            raise KeyError(height)
+        return self._values[i]
+
+    def __setitem__(self, height, value):
+        if not self._heights or height > self._heights[-1] + self.tolerance:
+            self._heights.append(height)
+            self._values.append(value)
+            return
+        i = self._find(height)
+        if i is not None:
+            self._values[i] = value
+            return
+        i = bisect_left(self._heights, height)
+        self._heights.insert(i, height)
+        self._values.insert(i, value)
+
+    def __delitem__(self, height):
+        i = self._find(height)
+        if i is None:
+            raise KeyError(height)
+        del self._heights[i]
+        del self._values[i]
+
+    def __contains__(self, height):
+        return self._find(height) is not None
+
+    def __len__(self):
+        return len(self._heights)
+
+    def __iter__(self):
+        return iter(list(self._heights))
+
+    def get(self, height, default=None):
+        i = self._find(height)
+        if i is None:
+            return default
+        return self._values[i]
+
+    def keys(self) -> list[float]:
+        return list(self._heights)
+
+    def values(self) -> list:
+        return list(self._values)
+
+    def items(self) -> list:
+        return list(zip(self._heights, self._values))
+
+    @property
+    def heights(self) -> np.ndarray:
+        """Stored heights as a sorted array"""
+        return np.array(self._heights)
+
+    def nearest(self, height):
+        """Returns the (height, value) pair closest to height"""
+        if not self._heights:
+            raise KeyError(height)
+        i = bisect_left(self._heights, height)
+        candidates = [j for j in (i - 1, i) if 0 <= j < len(self._heights)]
+        j = min(candidates, key=lambda j: abs(self._heights[j] - height))
+        return self._heights[j], self._values[j]
+
+    def below(self, height):
+        """Returns the (height, value) pair right below height, None if there is none""" # noqa: E501
+        i = bisect_left(self._heights, height - self.tolerance)
+        if i == 0:
+            return None
+        return self._heights[i - 1], self._values[i - 1]
+
+    def range(self, zmin, zmax) -> list:
+        """Returns the (height, value) pairs with zmin <= height <= zmax"""
+        i = bisect_left(self._heights, zmin - self.tolerance)
+        j = bisect_right(self._heights, zmax + self.tolerance)
+        return list(zip(self._heights[i:j], self._values[i:j]))
+
+    def merge(self, other, combine=None):
+        """
+        Merges the entries of other into this store.
+
+        ARGS:
+        other: entries to merge (LayerStore or dict)
+        combine: function called as combine(current, new) for heights present
+                 in both, its result is stored (default: keep the new value)
+        """
+        items = other.items()
+        for height, value in items:
+            i = self._find(height)
+            if i is not None and combine is not None:
+                self._values[i] = combine(self._values[i], value)
+            else:
+                self[height] = value
@@ -1,5 +1,6 @@
 from shapely.ops import split
 from shapely.geometry import LineString, MultiLineString
+import numpy as np
 
 def retract(path, ratio):
     x, y = path.xy
@@ -12,7 +13,12 @@ def retract(path, ratio):
 
 def split_lines(lines, spliter):
     final = []
+    minx, miny, maxx, maxy = spliter.bounds
     for line in lines:
+        bounds = line.bounds
+        if bounds[0] > maxx or bounds[2] < minx or bounds[1] > maxy or bounds[3] < miny:
+            final.append(line)
+            continue
         splited = split(line, spliter)
         for i in list(splited.geoms):
             if type(i) == LineString:
@@ -26,3 +32,22 @@ def split_by_regions(lines, regions):
     for region in regions:
         final = split_lines(final, region)
     return MultiLineString(final)
+
+
+def find_region(path, regions, bounds):
+    """
+    Index of the first region containing path, None if there is none.
+
+    Regions whose bounding box does not contain the path bounding box are
+    culled before the exact test.
+    """
+    if not regions:
+        return None
+    b = path.bounds
+    bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+    candidates = np.flatnonzero((bounds[:, 0] <= b[0]) & (bounds[:, 1] <= b[1])
+                                & (bounds[:, 2] >= b[2]) & (bounds[:, 3] >= b[3]))
+    for i in candidates:
+        if path.within(regions[i]):
+            return int(i)
+    return None
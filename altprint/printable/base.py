@@ -14,3 +14,20 @@ class BasePrint(ABC):
     @abstractmethod
     def export_gcode(self, filename):
         pass
+
+    def iter_layers(self):
+        """Generates the layers, yielding each height and layer once done"""
+        self.make_layers()
+        yield from self.layers.items()
+
+    def gcode_cache(self):
+        """Cache the gcode exporter stores the layer gcode in, if any"""
+        return getattr(self.process, 'gcode_cache', None)
+
+    def make_exporter(self):
+        """The process gcode exporter, with this printable's gcode cache"""
+        exporter = self.process.gcode_exporter(start_script=self.process.start_script,
+                                               end_script=self.process.end_script)
+        # set afterwards, exporters written before the cache do not take it
+        exporter.cache = self.gcode_cache()
+        return exporter
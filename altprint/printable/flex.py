@@ -1,10 +1,17 @@
+from shapely.geometry import MultiLineString
 from altprint.printable.base import BasePrint
 from altprint.slicer import STLSlicer
 from altprint.layer import Layer, Raster
+from altprint.skirt import make_skirt
+from altprint.layerstore import LayerStore
 from altprint.height_method import StandartHeightMethod
 from altprint.infill.rectilinear_infill import RectilinearInfill
 from altprint.gcode import GcodeExporter
-from altprint.lineutil import split_by_regions, retract
+from altprint.profiler import profiled
+from altprint.lineutil import split_by_regions, retract, find_region
+from altprint.island import IslandIndex
+from altprint.checkpoint import Checkpoint
+from altprint.speedprofile import make_profile, slice_regions
 from altprint.settingsparser import SettingsParser
 
 class FlexProcess():
@@ -12,7 +19,8 @@ class FlexProcess():
         prop_defaults = {
             "model_file": "",
             "flex_model_file": "",
-            "slicer": STLSlicer(StandartHeightMethod()),
+            "slicer": None,
+            "simplify_tolerance": 0.0,
             "infill_method": RectilinearInfill,
             "infill_angle": 0,
             "offset": (0, 0, 0),
@@ -24,6 +32,7 @@ class FlexProcess():
             "skirt_distance": 10,
             "skirt_num": 3,
             "skirt_gap": 0.5,
+            "skirt": True,
             "first_layer_flow": 2,
             "flow": 1.2,
             "speed": 2400,
@@ -33,8 +42,16 @@ class FlexProcess():
             "retract_speed": 1200,
             "retract_ratio": 0.9,
             "gcode_exporter": GcodeExporter,
+            "gcode_cache": None,
+            "export_processes": 1,
+            "speed_profile": None,
+            "override_models": [],
             "start_script": "",
             "end_script": "",
+            "profile": False,
+            "profile_output": "altprint_profile",
+            "checkpoint_dir": None,
+            "checkpoint_every": 10,
             "verbose": True,
         }
 
@@ -50,72 +67,101 @@ class FlexProcess():
 class FlexPrint(BasePrint):
     """The common print. Nothing special"""
 
-    _height = float
-    _layers_dict = dict[_height, Layer]
-
     def __init__(self, process: FlexProcess):
         self.process = process
-        self.layers: _layers_dict = {} #noqa: F821
+        self.layers = LayerStore()
         self.heights: list[float] = []
+        self.islands = IslandIndex()
 
+    @profiled("slice")
     def slice(self):
         if self.process.verbose is True:
             print("slicing {} ...".format(self.process.model_file))
+        if self.process.slicer is None:
+            self.process.slicer = STLSlicer(StandartHeightMethod(),
+                                            simplify_tolerance=self.process.simplify_tolerance) # noqa: E501
         slicer = self.process.slicer
         slicer.load_model(self.process.model_file)
         slicer.translate_model(self.process.offset)
         self.sliced_planes = slicer.slice_model()
         self.heights = self.sliced_planes.get_heights()
+        if self.process.verbose is True and self.sliced_planes.vertex_count:
+            print("simplified slices from {} to {} vertices".format(*self.sliced_planes.vertex_count)) # noqa: E501
 
         slicer.load_model(self.process.flex_model_file)
         slicer.translate_model(self.process.offset)
         self.flex_planes = slicer.slice_model(self.heights)
+        self.regions = slice_regions(slicer, self.process.override_models,
+                                     self.process.offset, self.heights)
 
+    @profiled("make_layers")
     def make_layers(self):
+        for _ in self.iter_layers():
+            pass
+
+    def iter_layers(self):
+        """Generates the layers one by one, yielding each height and layer"""
         if self.process.verbose is True:
             print("generating layers ...")
+        self.islands = IslandIndex()
         infill_method = self.process.infill_method()
+        profile = make_profile(self.process.speed_profile, self.regions)
+        checkpoint = Checkpoint.for_print(self)
+        saved = LayerStore(checkpoint.load() if checkpoint is not None else None)
         
-        skirt = Layer(self.sliced_planes.planes[self.heights[0]],
-                      self.process.skirt_num,
-                      self.process.skirt_gap,
-                      - self.process.skirt_distance - self.process.skirt_gap * self.process.skirt_num, #noqa: E501
-                      self.process.overlap)
-        skirt.make_perimeter()
+        if self.process.skirt:
+            skirt_paths = make_skirt([self.sliced_planes.planes[self.heights[0]]],
+                                     self.process.skirt_num,
+                                     self.process.skirt_gap,
+                                     self.process.skirt_distance,
+                                     self.process.overlap)
+        else:
+            skirt_paths = MultiLineString()
 
         for i, height in enumerate(self.heights):
+            if height in saved:
+                layer = saved[height]
+                if layer.shape != []:
+                    # keeps the island travel position as if the layer was generated
+                    self.islands.travel(self.islands.add_layer(height, layer.shape))
+                self.layers[height] = layer
+                yield height, layer
+                continue
             layer = Layer(self.sliced_planes.planes[height],
                           self.process.perimeter_num,
                           self.process.perimeter_gap,
                           self.process.external_adjust,
-                          self.process.overlap)
+                          self.process.overlap,
+                          height)
             if layer.shape == []:
                 self.layers[height] = layer
+                if checkpoint is not None:
+                    checkpoint.save_layer(height, layer)
+                yield height, layer
                 continue
-            layer.make_perimeter()
-            layer.make_infill_border()
-            infill_paths = infill_method.generate_infill(layer,
+            islands = self.islands.add_layer(height, layer.shape)
+            infill_paths = self.islands.make_paths(layer, islands, infill_method,
                                                    self.process.raster_gap,
                                                    self.process.infill_angle)
             flex_regions = self.flex_planes.planes[height]
 
             if not type(flex_regions) == list: #noqa: E721
                 flex_regions = list(flex_regions.geoms)
+            flex_borders = [region.buffer(0.01, join_style=2) for region in flex_regions] #noqa: E501
+            flex_bounds = [border.bounds for border in flex_borders]
 
             layer.perimeter_paths = split_by_regions(layer.perimeter_paths, flex_regions) #noqa: E501
             infill_paths = split_by_regions(infill_paths, flex_regions)
             if i==0: #skirt
-                for path in skirt.perimeter_paths.geoms:
-                    layer.perimeter.append(Raster(path, self.process.first_layer_flow, self.process.speed)) #noqa: E501
+                for path in skirt_paths.geoms:
+                    layer.skirt.append(Raster(path, self.process.first_layer_flow, self.process.speed)) #noqa: E501
             for path in layer.perimeter_paths.geoms:
                 flex_path = False
-                for region in flex_regions:
-                    if path.within(region.buffer(0.01, join_style=2)):
-                        flex_path, retract_path = retract(path, self.process.retract_ratio) #noqa: E501
-                        layer.perimeter.append(Raster(flex_path, self.process.flex_flow, self.process.flex_speed)) #noqa: E501
-                        layer.perimeter.append(Raster(retract_path, self.process.retract_flow, self.process.retract_speed)) #noqa: E501
-                        flex_path = True
-                        break
+                if find_region(path, flex_borders, flex_bounds) is not None:
+                    flex_path, retract_path = retract(path, self.process.retract_ratio) #noqa: E501
+                    layer.perimeter.append(Raster(flex_path, self.process.flex_flow, self.process.flex_speed)) #noqa: E501
+                    layer.perimeter.append(Raster(retract_path, self.process.retract_flow, self.process.retract_speed)) #noqa: E501
+                    flex_path = True
                 if not flex_path:
                     if i==0: 
                         layer.perimeter.append(Raster(path, self.process.first_layer_flow, self.process.speed)) #noqa: E501
@@ -124,25 +170,41 @@ class FlexPrint(BasePrint):
 
             for path in infill_paths.geoms:
                 flex_path = False
-                for region in flex_regions:
-                    if path.within(region.buffer(0.01, join_style=2)):
-                        flex_path, retract_path = retract(path, self.process.retract_ratio) #noqa: E501
-                        layer.infill.append(Raster(flex_path, self.process.flex_flow, self.process.flex_speed)) #noqa: E501
-                        layer.infill.append(Raster(retract_path, self.process.retract_flow, self.process.retract_speed)) #noqa: E501
-                        flex_path = True
-                        break
+                if find_region(path, flex_borders, flex_bounds) is not None:
+                    flex_path, retract_path = retract(path, self.process.retract_ratio) #noqa: E501
+                    layer.infill.append(Raster(flex_path, self.process.flex_flow, self.process.flex_speed)) #noqa: E501
+                    layer.infill.append(Raster(retract_path, self.process.retract_flow, self.process.retract_speed)) #noqa: E501
+                    flex_path = True
                 if not flex_path:
                     if i==0:
                         layer.infill.append(Raster(path, self.process.first_layer_flow, self.process.speed)) #noqa: E501
                     else:
                         layer.infill.append(Raster(path, self.process.flow, self.process.speed)) #noqa: E501
+            if profile is not None:
+                profile.apply(layer, [(planes.planes[height], speed, flow)
+                                      for planes, speed, flow in self.regions])
             self.layers[height] = layer
+            if checkpoint is not None:
+                checkpoint.save_layer(height, layer)
+            yield height, layer
+        if checkpoint is not None:
+            checkpoint.flush()
+
+    def gcode_cache(self):
+        """The process gcode cache, or the checkpoint's one if it has none"""
+        if self.process.gcode_cache is None and self.process.checkpoint_dir is not None:
+            return Checkpoint.for_print(self).gcode_cache()
+        return self.process.gcode_cache
 
+    @profiled("export_gcode")
     def export_gcode(self, filename):
         if self.process.verbose is True:
             print("exporting gcode to {}".format(filename))
 
-        gcode_exporter = self.process.gcode_exporter(start_script=self.process.start_script, #noqa: E501
-                                                     end_script=self.process.end_script)
-        gcode_exporter.make_gcode(self)
-        gcode_exporter.export_gcode(filename)
+        gcode_exporter = self.make_exporter()
+        if self.process.export_processes == 1:
+            gcode_exporter.make_gcode(self)
+            gcode_exporter.export_gcode(filename)
+        else:
+            gcode_exporter.export_gcode_parallel(self, filename,
+                                                 self.process.export_processes)
@@ -2,6 +2,8 @@ from altprint.printable.base import BasePrint
 from altprint.slicer import STLSlicer
 from altprint.height_method import CopyHeightsFromFileMethod
 from altprint.gcode import GcodeExporter
+from altprint.gcodereader import read_markers
+from altprint.layerstore import LayerStore
 
 
 class InjectionProcess():
@@ -21,8 +23,10 @@ class InjectionPrint(BasePrint):
 
     def __init__(self, process: InjectionProcess):
         self.process = process
-        self.layers: _layers_dict = {} # noqa: F821
-        self.layers_gcode = {}
+        self.layers = LayerStore()
+        self.layers_gcode = LayerStore()
+        self.heights: list[float] = []
+        self.marker_ends = []
         for part in self.process.parts:
             part.process.slicer = STLSlicer(CopyHeightsFromFileMethod(self.process.source_gcode)) #noqa: E501
             part.process.offset = self.process.parts_offset
@@ -37,8 +41,9 @@ class InjectionPrint(BasePrint):
 
     def make_layers_gcode(self):
         gcode_exporter = GcodeExporter()
-        heights = CopyHeightsFromFileMethod(self.process.source_gcode).get_heights()
-        for height in heights:
+        heights, self.marker_ends = read_markers(self.process.source_gcode)
+        self.heights = heights.tolist()
+        for height in self.heights:
             layer_gcode = []
             for part in self.process.parts:
                 layer_gcode.extend(gcode_exporter.make_layer_gcode(part.layers[height]))
@@ -46,15 +51,11 @@ class InjectionPrint(BasePrint):
         
     def export_gcode(self, filename):
         self.make_layers_gcode()
-        output_lines = []
-        with open(self.process.source_gcode, "r") as f:
-            lines = f.readlines()
-        for line in lines:
-            output_lines.append(line)
-            if line.startswith("; ALTPRINT"):
-                height = float(line.split(' ')[-1])
-                output_lines.extend(self.layers_gcode[height])
-            
-        with open(filename, "w") as f:
-            for line in output_lines:
-                f.write(line)
\ No newline at end of file
+        with open(self.process.source_gcode, "rb") as source, open(filename, "wb") as f:
+            start = 0
+            for height, end in zip(self.heights, self.marker_ends):
+                f.write(source.read(end - start))
+                for gcode in self.layers_gcode[height]:
+                    f.write(gcode.encode())
+                start = end
+            f.write(source.read())
@@ -1,15 +1,37 @@
+import warnings
 from altprint.printable.base import BasePrint
-from altprint.layer import Layer
+from altprint.layer import Layer, Raster
+from altprint.skirt import make_skirt
+from altprint.layerstore import LayerStore
 from altprint.gcode import GcodeExporter
+from altprint.profiler import profiled
 
 class MultiProcess():
+    """
+    Settings of a print made of several parts.
+
+    With merge_skirts the plate gets a single skirt around all the parts, in
+    place of their own. Build the parts with skirt=False in that case, their
+    skirts would be made only to be dropped.
+    """
+
     def __init__(self, **kwargs):
         prop_defaults = {
             "parts": [],
             "gcode_exporter": GcodeExporter,
+            "gcode_cache": None,
+            "export_processes": 1,
             "start_script": "",
             "end_script": "",
             "offset": (0,0,0),
+            "merge_skirts": False,
+            "skirt_distance": 10,
+            "skirt_num": 3,
+            "skirt_gap": 0.5,
+            "flow": 1.2,
+            "speed": 2400,
+            "profile": False,
+            "profile_output": "altprint_profile",
             "verbose": True,
         }
 
@@ -18,38 +40,59 @@ class MultiProcess():
 
 class MultiPrint(BasePrint):
 
-    _height = float
-    _layers_dict = dict[_height, Layer]
-
     def __init__(self, process):
         self.process = process
-        self.layers: _layers_dict = {} #noqa: F821
+        self.layers = LayerStore()
 
+    @profiled("slice")
     def slice(self):
         pass
 
+    @profiled("make_layers")
     def make_layers(self):
         if self.process.verbose is True:
             print("Making the layers for the multipart ...")
-        heights = []
+        self.layers = LayerStore()
         for part in self.process.parts:
-            heights.extend(list(part.layers.keys()))
+            first = part.layers.values()[0] if part.layers else None
+            if self.process.merge_skirts and first is not None and first.skirt:
+                warnings.warn("merge_skirts drops the skirt of a part built with skirt=True") # noqa: E501
+            for h, part_layer in part.layers.items():
+                layer = self.layers.get(h)
+                if layer is None:
+                    layer = Layer(None, None, None, None, None)
+                    self.layers[h] = layer
+                if not self.process.merge_skirts:
+                    layer.perimeter.extend(part_layer.skirt)
+                layer.infill.extend(part_layer.infill)
+                layer.perimeter.extend(part_layer.perimeter)
 
-        heights = list(set(heights))
-        heights.sort()
+        if self.process.merge_skirts and self.layers:
+            self.make_plate_skirt(self.layers.keys()[0])
 
-        for h in heights:
-            layer = Layer(None, None, None, None, None)
-            for part in self.process.parts:
-                if h in part.layers.keys():
-                    layer.infill.extend(part.layers[h].infill)
-                    layer.perimeter.extend(part.layers[h].perimeter)
-            self.layers[h] = layer
+    def make_plate_skirt(self, height):
+        """Replaces the skirts of the parts by a single skirt around the plate"""
+
+        first_shapes = []
+        for part in self.process.parts:
+            if part.layers:
+                first_shapes.append(next(iter(part.layers.values())).shape)
+        skirt_paths = make_skirt(first_shapes,
+                                 self.process.skirt_num,
+                                 self.process.skirt_gap,
+                                 self.process.skirt_distance,
+                                 convex=True)
+        for path in skirt_paths.geoms:
+            self.layers[height].skirt.append(Raster(path, self.process.flow, self.process.speed)) #noqa: E501
 
+    @profiled("export_gcode")
     def export_gcode(self, filename):
         if self.process.verbose is True:
             print("exporting gcode to {}".format(filename))
-        gcode_exporter = self.process.gcode_exporter(start_script=self.process.start_script, #noqa: E501
-                                                     end_script=self.process.end_script)
-        gcode_exporter.make_gcode(self)
-        gcode_exporter.export_gcode(filename)
+        gcode_exporter = self.make_exporter()
+        if self.process.export_processes == 1:
+            gcode_exporter.make_gcode(self)
+            gcode_exporter.export_gcode(filename)
+        else:
+            gcode_exporter.export_gcode_parallel(self, filename,
+                                                 self.process.export_processes)
@@ -0,0 +1,171 @@
+from collections import Counter
+from contextlib import contextmanager
+import functools
+import os
+import sys
+import threading
+import time
+
+# functions whose time is reported on their own in the profile report
+STAGE_FUNCTIONS = [
+    "section_multiplane",
+    "Layer.make_perimeter", "Layer.make_infill_border", "generate_infill",
+    "rectilinear_fill", "find_path", "split_by_regions", "Raster.__init__",
+    "SpeedProfile.apply", "GcodeExporter.segment", "GcodeExporter.export_gcode",
+]
+
+
+_HAS_QUALNAME = sys.version_info >= (3, 11)
+_qualnames = {}
+
+
+def _frame_name(frame):
+    """
+    Qualified name of the function of a frame. Before Python 3.11 code objects
+    have no co_qualname, so methods are looked up in the classes of the module
+    defining them.
+    """
+    code = frame.f_code
+    if _HAS_QUALNAME:
+        return code.co_qualname
+    name = _qualnames.get(code)
+    if name is None:
+        name = code.co_name
+        for value in list(frame.f_globals.values()):
+            method = value.__dict__.get(code.co_name) if isinstance(value, type) else None # noqa: E501
+            if getattr(method, '__code__', None) is code:
+                name = value.__qualname__ + '.' + code.co_name
+                break
+        _qualnames[code] = name
+    return name
+
+
+class SamplingProfiler:
+    """
+    Sampling profiler for a thread of the slicing pipeline.
+
+    A background thread records the call stack of the profiled thread every
+    interval seconds while a stage is running. Stacks are rooted at the name
+    of the pipeline stage they were taken in.
+    """
+
+    def __init__(self, interval: float = 0.001, stage_functions=STAGE_FUNCTIONS):
+        self.interval = interval
+        self.stage_functions = stage_functions
+        self.samples = Counter()
+        self.wall_time = Counter()
+        self.stage_name = None
+        self._thread = None
+        self._running = False
+        self._target = None
+
+    def _sample(self):
+        while self._running:
+            frame = sys._current_frames().get(self._target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((_frame_name(frame), code.co_filename, code.co_firstlineno)) # noqa: E501
+                frame = frame.f_back
+            if stack:
+                self.samples[(self.stage_name,) + tuple(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+    @contextmanager
+    def stage(self, name):
+        """Samples the calling thread while the block runs, under stage name"""
+        if self._running:
+            yield
+            return
+        self.stage_name = name
+        self._target = threading.get_ident()
+        self._running = True
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        start = time.perf_counter()
+        self._thread.start()
+        try:
+            yield
+        finally:
+            self._running = False
+            self._thread.join()
+            self.wall_time[name] += time.perf_counter() - start
+
+    def _label(self, frame):
+        name, filename, line = frame
+        return "{} ({}:{})".format(name, os.path.basename(filename), line)
+
+    def collapsed(self) -> list[str]:
+        """Stacks in the collapsed format read by flamegraph tools"""
+        lines = []
+        for stack, count in self.samples.items():
+            labels = [stack[0]] + [self._label(frame) for frame in stack[1:]]
+            lines.append("{} {}".format(";".join(labels), count))
+        return sorted(lines)
+
+    def top(self, n: int = 20) -> list:
+        """The n functions with most samples as (function, self, total) tuples"""
+        own = Counter()
+        total = Counter()
+        for stack, count in self.samples.items():
+            own[self._label(stack[-1])] += count
+            for label in set(self._label(frame) for frame in stack[1:]):
+                total[label] += count
+        return [(label, own[label], total[label])
+                for label, _ in total.most_common(n)]
+
+    def stage_times(self) -> dict:
+        """
+        Seconds spent in each pipeline stage and stage function, the samples
+        of a stage sharing its measured wall time.
+        """
+        stage_samples = Counter()
+        for stack, count in self.samples.items():
+            stage_samples[stack[0]] += count
+        times = Counter()
+        for stack, count in self.samples.items():
+            seconds = count * self.wall_time[stack[0]] / stage_samples[stack[0]]
+            times[stack[0]] += seconds
+            names = set(frame[0] for frame in stack[1:])
+            short_names = set(name.rsplit('.', 1)[-1] for name in names)
+            for function in self.stage_functions:
+                if function in names or ('.' not in function and function in short_names): # noqa: E501
+                    times[function] += seconds
+        return dict(times)
+
+    def report(self, n: int = 20) -> str:
+        lines = ["samples: {} (interval {} s)".format(sum(self.samples.values()),
+                                                   self.interval), "",
+                 "stage times (s):"]
+        for name, seconds in sorted(self.stage_times().items(), key=lambda t: -t[1]):
+            lines.append("  {:<40} {:10.3f}".format(name, seconds))
+        lines += ["", "top functions (self samples, total samples):"]
+        for label, own, total in self.top(n):
+            lines.append("  {:<70} {:8d} {:8d}".format(label, own, total))
+        return "\n".join(lines) + "\n"
+
+    def write(self, prefix: str, n: int = 20):
+        """Writes prefix.collapsed and prefix.txt"""
+        with open(prefix + ".collapsed", "w") as f:
+            f.write("\n".join(self.collapsed()) + "\n")
+        with open(prefix + ".txt", "w") as f:
+            f.write(self.report(n))
+
+
+def profiled(stage):
+    """
+    Runs a printable method under the printable's profiler when the process
+    has profile enabled, and writes the profile after it.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not getattr(self.process, 'profile', False):
+                return method(self, *args, **kwargs)
+            if getattr(self, 'profiler', None) is None:
+                self.profiler = SamplingProfiler()
+            with self.profiler.stage(stage):
+                result = method(self, *args, **kwargs)
+            self.profiler.write(self.process.profile_output)
+            return result
+        return wrapper
+    return decorator
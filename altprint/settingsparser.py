@@ -1,8 +1,7 @@
-import yaml
-
 class SettingsParser:
     
     def load_from_file(self, configfname):
+        import yaml
 
         with open(configfname, 'r') as f:
             params = yaml.safe_load(f)
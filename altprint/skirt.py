@@ -0,0 +1,64 @@
+from collections import OrderedDict
+import hashlib
+import threading
+from shapely.geometry import Polygon, MultiPolygon, MultiLineString
+from shapely.ops import unary_union
+from altprint.layer import Layer
+
+_skirt_cache = OrderedDict()
+_max_skirts = 32
+_skirt_lock = threading.Lock()
+
+
+def make_skirt(shapes, skirt_num, skirt_gap, skirt_distance, overlap=0.0, convex=False) -> MultiLineString: # noqa: E501
+    """
+    Generates the skirt paths around one or more first layer shapes.
+
+    Several shapes are merged into a single outline, so a plate gets one skirt
+    instead of one per part. The last _max_skirts results are cached by a hash
+    of the first layer geometry.
+
+    ARGS:
+    shapes: first layer shapes (list of MultiPolygon)
+    skirt_num: number of skirt loops (int)
+    skirt_gap: gap between skirt loops (float)
+    skirt_distance: distance between the shapes and the skirt (float)
+    overlap: layer overlap (default 0.0) (float)
+    convex: use the convex hull of the shapes as outline (default False) (bool)
+
+    RETURNS:
+    Skirt paths (MultiLineString)
+    """
+    shapes = [shape for shape in shapes if shape]
+    if not shapes:
+        return MultiLineString()
+    h = hashlib.blake2b(digest_size=20)
+    for shape in shapes:
+        h.update(shape.wkb)
+    key = (h.hexdigest(), skirt_num, skirt_gap, skirt_distance, overlap, convex)
+    with _skirt_lock:
+        if key in _skirt_cache:
+            _skirt_cache.move_to_end(key)
+            return _skirt_cache[key]
+
+    if len(shapes) == 1:
+        outline = shapes[0]
+    else:
+        outline = unary_union(shapes)
+    if convex:
+        outline = outline.convex_hull
+    if isinstance(outline, Polygon):
+        outline = MultiPolygon([outline])
+
+    skirt = Layer(outline,
+                  skirt_num,
+                  skirt_gap,
+                  - skirt_distance - skirt_gap * skirt_num,
+                  overlap)
+    skirt.make_perimeter()
+    with _skirt_lock:
+        _skirt_cache[key] = skirt.perimeter_paths
+        _skirt_cache.move_to_end(key)
+        while len(_skirt_cache) > _max_skirts:
+            _skirt_cache.popitem(last=False)
+    return skirt.perimeter_paths
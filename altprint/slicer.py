@@ -1,6 +1,10 @@
 from abc import ABC, abstractmethod
-import trimesh
-from shapely.geometry import MultiPolygon
+from collections import OrderedDict
+import os
+import threading
+import numpy as np
+import shapely
+from shapely.geometry import Polygon, MultiPolygon
 from altprint.height_method import HeightMethod
 
 class SlicedPlanes:
@@ -11,15 +15,104 @@ class SlicedPlanes:
     _coord = tuple[float, float, float]
     _bounds_coords = tuple[_coord, _coord]
 
-    def __init__(self, planes: _planes_dict, bounds : _bounds_coords):
+    def __init__(self, planes: _planes_dict, bounds : _bounds_coords, vertex_count=None): # noqa: E501
 
         self.planes = planes
         self.bounds = bounds
+        self.vertex_count = vertex_count
 
     def get_heights(self):
         return list(self.planes.keys())
 
 
+def count_vertices(geometries) -> int:
+    """Total number of vertices of an array of geometries"""
+    if hasattr(shapely, 'get_num_coordinates'):
+        return int(shapely.get_num_coordinates(geometries).sum())
+    total = 0
+    for geometry in geometries:
+        for polygon in geometry.geoms:
+            total += len(polygon.exterior.coords)
+            total += sum(len(hole.coords) for hole in polygon.interiors)
+    return total
+
+
+def simplify_polygons(geometries, tolerance):
+    """
+    Simplifies an array of polygonal geometries in a single call, keeping
+    every vertex within tolerance of the original outline.
+
+    RETURNS:
+    Simplified geometries, as MultiPolygons (list)
+    """
+    if hasattr(shapely, 'simplify'):
+        simplified = shapely.simplify(geometries, tolerance, preserve_topology=True)
+    else:
+        simplified = [g.simplify(tolerance, preserve_topology=True) for g in geometries]
+    result = []
+    for geometry in simplified:
+        if isinstance(geometry, Polygon):
+            geometry = MultiPolygon([geometry])
+        elif not isinstance(geometry, MultiPolygon):
+            geometry = MultiPolygon([g for g in getattr(geometry, 'geoms', [])
+                                     if isinstance(g, Polygon)])
+        result.append(geometry)
+    return result
+
+
+_mesh_cache = OrderedDict()
+_max_meshes = 8
+_mesh_lock = threading.Lock()
+
+
+def load_mesh_cached(model_file: str, translation=None):
+    """
+    Loads a mesh through a process wide cache.
+
+    Meshes are keyed by absolute path, modification time and size of the file,
+    plus the translation applied to them, so parts sharing the same model and
+    offset share the same mesh object. Only the _max_meshes most recently used
+    meshes are kept. Cached meshes must not be modified. The cache may be used
+    from several threads, a mesh loaded by two of them at once is kept once.
+
+    ARGS:
+    model_file: path to the model file (str)
+    translation: translation applied to the loaded mesh (default None) (tuple)
+
+    RETURNS:
+    Loaded mesh (trimesh.Trimesh)
+    """
+    import trimesh
+
+    stat = os.stat(model_file)
+    key = (os.path.abspath(model_file), stat.st_mtime_ns, stat.st_size)
+    if translation is not None and any(translation):
+        key = key + (tuple(float(t) for t in translation),)
+    else:
+        translation = None
+    with _mesh_lock:
+        if key in _mesh_cache:
+            _mesh_cache.move_to_end(key)
+            return _mesh_cache[key]
+    if translation is None:
+        mesh = trimesh.load_mesh(model_file)
+    else:
+        mesh = load_mesh_cached(model_file).copy()
+        mesh.apply_translation(translation)
+    with _mesh_lock:
+        mesh = _mesh_cache.setdefault(key, mesh)
+        _mesh_cache.move_to_end(key)
+        while len(_mesh_cache) > _max_meshes:
+            _mesh_cache.popitem(last=False)
+    return mesh
+
+
+def clear_mesh_cache():
+    """Drops every mesh held by the process wide cache"""
+    with _mesh_lock:
+        _mesh_cache.clear()
+
+
 class Slicer(ABC):
     """Slicer base object"""
 
@@ -38,14 +131,31 @@ class Slicer(ABC):
 class STLSlicer(Slicer):
     """Slice .stl cad files"""
 
-    def __init__(self, height_method: HeightMethod):
+    def __init__(self, height_method: HeightMethod, cache: bool = True,
+                 simplify_tolerance: float = 0.0):
         self.height_method = height_method
+        self.cache = cache
+        self.simplify_tolerance = simplify_tolerance
+        self.model_file = None
+        self.translation = None
 
     def load_model(self, model_file: str):
-        self.model = trimesh.load_mesh(model_file)
+        self.model_file = model_file
+        self.translation = None
+        if self.cache:
+            self.model = load_mesh_cached(model_file)
+        else:
+            import trimesh
+            self.model = trimesh.load_mesh(model_file)
 
     def translate_model(self, translation):
-        self.model.apply_translation(translation)
+        if self.cache:
+            if self.translation is not None:
+                translation = [a + b for a, b in zip(self.translation, translation)]
+            self.translation = translation
+            self.model = load_mesh_cached(self.model_file, translation)
+        else:
+            self.model.apply_translation(translation)
 
     def slice_model(self, heights = None) -> SlicedPlanes:
         if not heights:
@@ -58,4 +168,16 @@ class STLSlicer(Slicer):
             else:
                 planes[heights[i]] = []
 
-        return SlicedPlanes(planes, self.model.bounds)
+        vertex_count = None
+        if self.simplify_tolerance > 0:
+            filled = [h for h in heights if planes[h]]
+            geometries = np.empty(len(filled), dtype=object)
+            geometries[:] = [planes[h] for h in filled]
+            before = count_vertices(geometries)
+            simplified = simplify_polygons(geometries, self.simplify_tolerance)
+            for height, geometry in zip(filled, simplified):
+                planes[height] = geometry
+            after = count_vertices(simplified)
+            vertex_count = (before, after)
+
+        return SlicedPlanes(planes, self.model.bounds, vertex_count)
@@ -0,0 +1,149 @@
+from itertools import chain
+import numpy as np
+
+try:
+    from shapely import contains_xy
+except ImportError:  # Shapely < 2.0
+    from shapely.vectorized import contains as contains_xy
+
+
+class SpeedProfile:
+    """
+    Assigns per vertex speeds and flows to all the rasters of a layer at once.
+
+    The speed of a vertex is the speed of the move that ends on it. Speeds
+    are in mm/min, like in the gcode, and acceleration in mm/s².
+
+    ARGS:
+    acceleration: printer acceleration, enables the corner slowdown (float)
+    junction_deviation: junction deviation used to limit the speed through
+                        corners (default 0.05 mm) (float)
+    min_speed: lowest speed the profile assigns (default 300) (float)
+    min_segment_length: segments shorter than this are limited to
+                        short_segment_speed (float)
+    short_segment_speed: speed limit of the short segments (float)
+    """
+
+    def __init__(self, acceleration=None, junction_deviation=0.05, min_speed=300,
+                 min_segment_length=None, short_segment_speed=None):
+        self.acceleration = acceleration
+        self.junction_deviation = junction_deviation
+        self.min_speed = min_speed
+        self.min_segment_length = min_segment_length
+        self.short_segment_speed = short_segment_speed
+
+    def junction_speeds(self, coords, starts, ends):
+        """Highest speed (mm/s) through each vertex allowed by the acceleration"""
+        n = len(coords)
+        unit = np.zeros((n, 2))
+        d = np.diff(coords, axis=0)
+        lengths = np.hypot(d[:, 0], d[:, 1])
+        valid = lengths > 0
+        unit[1:][valid] = d[valid] / lengths[valid][:, None]
+        # unit[i] is the direction of the move ending on vertex i
+        cos_theta = np.ones(n)
+        cos_theta[:-1] = -np.einsum('ij,ij->i', unit[:-1], unit[1:])
+        sin_half = np.sqrt(np.clip(0.5 * (1 - cos_theta), 0, 1))
+        with np.errstate(divide='ignore'):
+            v = np.sqrt(self.acceleration * self.junction_deviation * sin_half
+                        / np.clip(1 - sin_half, 0, None))
+        v[starts] = 0
+        v[ends] = 0
+        return v
+
+    def apply(self, layer, regions=()):
+        """
+        Computes the speed and flow of every raster of the layer.
+
+        ARGS:
+        layer: layer whose rasters are updated (Layer)
+        regions: overrides as (shape, speed, flow) tuples; moves whose
+                 midpoint falls inside shape get that speed and flow, a
+                 None speed or flow keeps the current one (list)
+        """
+        rasters = list(chain(layer.skirt, layer.perimeter, layer.infill))
+        if not rasters:
+            return
+        sizes = [len(raster.speed) for raster in rasters]
+        coords = np.concatenate([np.asarray(r.path.coords)[:, :2] for r in rasters])
+        speed = np.concatenate([raster.speed for raster in rasters])
+        flow = np.concatenate([raster.flow for raster in rasters])
+        offsets = np.cumsum(sizes)
+        starts = np.concatenate([[0], offsets[:-1]])
+        ends = offsets - 1
+        # moves ending on the first vertex of a raster do not exist
+        moves = np.ones(len(coords), dtype=bool)
+        moves[starts] = False
+
+        d = np.zeros((len(coords), 2))
+        d[1:] = np.diff(coords, axis=0)
+        lengths = np.hypot(d[:, 0], d[:, 1])
+        midpoints = coords - d/2
+
+        for shape, region_speed, region_flow in regions:
+            if not shape:
+                continue
+            inside = moves & contains_xy(shape, midpoints[:, 0], midpoints[:, 1])
+            if region_speed is not None:
+                speed[inside] = region_speed
+            if region_flow is not None:
+                flow[inside] = region_flow
+
+        if self.min_segment_length is not None and self.short_segment_speed is not None: # noqa: E501
+            short = moves & (lengths < self.min_segment_length)
+            speed[short] = np.minimum(speed[short], self.short_segment_speed)
+
+        if self.acceleration is not None:
+            vj = self.junction_speeds(coords, starts, ends)
+            v_start = np.zeros(len(coords))
+            v_start[1:] = vj[:-1]
+            # peak speed of a move accelerating from and decelerating to
+            # the junction speeds at both of its ends
+            v_peak = np.sqrt((v_start**2 + vj**2) / 2 + self.acceleration * lengths)
+            limit = np.maximum(v_peak * 60, self.min_speed)
+            speed[moves] = np.minimum(speed[moves], limit[moves])
+
+        speed[starts] = speed[np.minimum(starts + 1, ends)]
+        for raster, s, f in zip(rasters, np.split(speed, offsets[:-1]),
+                                np.split(flow, offsets[:-1])):
+            raster.set_profile(s, f)
+
+
+def make_profile(speed_profile, regions=()):
+    """
+    Builds the profile of a process from its speed_profile setting.
+
+    ARGS:
+    speed_profile: profile, its parameters as a dict, or None (SpeedProfile)
+    regions: sliced region overrides (list)
+
+    RETURNS:
+    Profile to apply, None when there is nothing to do (SpeedProfile)
+    """
+    if isinstance(speed_profile, dict):
+        return SpeedProfile(**speed_profile)
+    if speed_profile is None and regions:
+        return SpeedProfile()
+    return speed_profile
+
+
+def slice_regions(slicer, override_models, offset, heights):
+    """
+    Slices the models of the region overrides at the given heights.
+
+    ARGS:
+    slicer: slicer used to slice the models (Slicer)
+    override_models: overrides as dicts with model_file, speed and flow (list)
+    offset: translation applied to the models (tuple)
+    heights: slicing heights (list)
+
+    RETURNS:
+    Sliced planes, speed and flow of each override (list)
+    """
+    regions = []
+    for override in override_models:
+        slicer.load_model(override["model_file"])
+        slicer.translate_model(offset)
+        planes = slicer.slice_model(heights)
+        regions.append((planes, override.get("speed"), override.get("flow")))
+    return regions
@@ -1,5 +1,566 @@
+import warnings
+import pytest
 from altprint.flow import calculate
+from altprint.gcode import GcodeExporter
 
 def test_calculate():
     calculate()
-    assert calculate() == 0.043611982826515246
\ No newline at end of file
+    assert calculate() == 0.043611982826515246
+
+def test_mesh_cache():
+    from altprint.slicer import load_mesh_cached
+    a = load_mesh_cached("examples/cube/cube.stl", (100, 100, 0))
+    b = load_mesh_cached("examples/cube/cube.stl", (100, 100, 0))
+    c = load_mesh_cached("examples/cube/cube.stl")
+    assert a is b
+    assert a is not c
+    assert (a.bounds[0] - c.bounds[0] == [100, 100, 0]).all()
+    assert load_mesh_cached("examples/cube/cube.stl", (0, 0, 0)) is c
+    from altprint import slicer
+    for x in range(2 * slicer._max_meshes):
+        load_mesh_cached("examples/cube/cube.stl", (x, 0, 0))
+    assert len(slicer._mesh_cache) == slicer._max_meshes
+
+
+def test_mesh_cache_threads():
+    from concurrent.futures import ThreadPoolExecutor
+    from altprint.slicer import load_mesh_cached, clear_mesh_cache
+    clear_mesh_cache()
+    with ThreadPoolExecutor(8) as pool:
+        meshes = list(pool.map(lambda x: load_mesh_cached("examples/cube/cube.stl", (x % 3, 0, 0)), range(48))) # noqa: E501
+    for x in range(3):
+        assert all(m is meshes[x] for m in meshes[x::3])
+
+
+def test_merged_skirt():
+    from shapely.geometry import Polygon, MultiPolygon
+    from altprint.skirt import make_skirt
+    a = MultiPolygon([Polygon([(0, 0), (10, 0), (10, 10), (0, 10)])])
+    b = MultiPolygon([Polygon([(20, 0), (30, 0), (30, 10), (20, 10)])])
+    skirt = make_skirt([a, b], 2, 0.5, 5, convex=True)
+    assert len(skirt.geoms) == 2
+    assert make_skirt([a, b], 2, 0.5, 5, convex=True) is skirt
+
+
+def test_merged_skirt_parts():
+    from altprint.printable.standart import StandartPrint, StandartProcess
+    from altprint.printable.multi import MultiPrint, MultiProcess
+    parts = [StandartPrint(StandartProcess(model_file="examples/cube/cube.stl",
+                                           offset=(x, 0, 0), verbose=False,
+                                           skirt=x > 0))
+             for x in (0, 40)]
+    multi = MultiPrint(MultiProcess(parts=parts, merge_skirts=True, verbose=False))
+    for part in parts:
+        part.slice()
+        part.make_layers()
+    assert parts[0].process.skirt is False and parts[1].process.skirt is True
+    assert all(not layer.skirt for layer in parts[0].layers.values())
+    with pytest.warns(UserWarning, match="skirt"):
+        multi.make_layers()
+    assert len(multi.layers.values()[0].skirt) == 3
+    parts[1].process.skirt = False
+    parts[1].make_layers()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        multi.make_layers()
+    assert len(multi.layers.values()[0].skirt) == 3
+
+
+def test_layer_store():
+    from altprint.layerstore import LayerStore
+    store = LayerStore()
+    for h in [0.4, 0.2, 0.6]:
+        store[h] = h
+    store[0.1 + 0.1] = "a"
+    assert store.keys() == [0.2, 0.4, 0.6]
+    assert store[float("0.2000001")] == "a"
+    assert 0.8 not in store
+    assert [h for h, _ in store.range(0.3, 0.6)] == [0.4, 0.6]
+    assert store.below(0.4) == (0.2, "a")
+    assert store.below(float("0.4000001")) == (0.2, "a")
+    assert store.below(0.2) is None
+    assert store.below(1.0) == (0.6, 0.6)
+    store.merge({0.4: 1, 0.8: 2}, lambda a, b: a + b)
+    assert store[0.4] == 1.4 and store[0.8] == 2
+
+
+def test_pattern_infill():
+    from shapely.geometry import Polygon, MultiPolygon
+    from altprint.layer import Layer
+    from altprint.infill.grid_infill import GridInfill
+    from altprint.infill.triangular_infill import TriangularInfill
+    from altprint.infill.gyroid_infill import GyroidInfill
+    shape = Polygon([(0, 0), (30, 0), (30, 30), (0, 30)],
+                    [[(10, 10), (20, 10), (20, 20), (10, 20)]])
+    layer = Layer(MultiPolygon([shape]), 2, 0.5, 0.5, 0.0, height=1.0)
+    layer.make_infill_border()
+    for method in (GridInfill(0.2), TriangularInfill(0.2), GyroidInfill(0.2)):
+        infill = method.generate_infill(layer, 0.5, 45)
+        assert len(infill.geoms) > 0
+        assert infill.within(layer.infill_border.buffer(1e-6))
+
+
+def test_gyroid_layers():
+    import numpy as np
+    from shapely.geometry import Polygon, MultiPolygon
+    from altprint.layer import Layer
+    from altprint.infill.gyroid_infill import GyroidInfill
+    method = GyroidInfill(0.2)
+    s = 2*np.pi / method.spacing(0.5)
+    for height, angle in [(1.0, 0), (1.2, 90)]:
+        shape = MultiPolygon([Polygon([(0, 0), (30, 0), (30, 30), (0, 30)])])
+        layer = Layer(shape, 2, 0.5, 0.5, 0.0, height=height)
+        layer.make_infill_border()
+        infill = method.generate_infill(layer, 0.5, angle)
+        x, y = np.concatenate([np.array(path.coords) for path in infill.geoms]).T * s
+        z = height * s
+        surface = np.sin(x)*np.cos(y) + np.sin(y)*np.cos(z) + np.sin(z)*np.cos(x)
+        assert np.abs(surface).max() < 0.05
+
+
+def test_async_run(tmp_path):
+    import asyncio
+    from altprint.aio import run
+    from altprint.printable.standart import StandartPrint, StandartProcess
+    process = StandartProcess(model_file="examples/cube/cube.stl",
+                              start_script="scripts/start.gcode",
+                              end_script="scripts/end.gcode",
+                              verbose=False)
+    part = StandartPrint(process)
+
+    async def consume():
+        return [event async for event in run(part, tmp_path / "cube.gcode")]
+
+    events = asyncio.run(consume())
+    stages = [event.stage for event in events]
+    assert stages.count('layer') == len(part.heights)
+    assert stages.count('gcode') == len(part.heights) + 2
+    content = "".join(event.gcode for event in events if event.stage == 'gcode')
+    assert (tmp_path / "cube.gcode").read_text() == content
+
+
+def test_async_run_settings(tmp_path, capsys):
+    import asyncio
+    from altprint.aio import run
+    from altprint.printable.standart import StandartPrint, StandartProcess
+    from altprint.printable.injection import InjectionPrint, InjectionProcess
+    process = StandartProcess(model_file="examples/cube/cube.stl",
+                              start_script="scripts/start.gcode",
+                              end_script="scripts/end.gcode",
+                              profile=True, profile_output=str(tmp_path / "profile"),
+                              checkpoint_dir=str(tmp_path / "ckpt"))
+    part = StandartPrint(process)
+
+    async def consume(printable):
+        return [event async for event in run(printable, tmp_path / "cube.gcode")]
+
+    asyncio.run(consume(part))
+    assert "generating layers" in capsys.readouterr().out
+    stages = (tmp_path / "profile.txt").read_text()
+    assert "make_layers" in stages and "export_gcode" in stages
+    assert len(list((tmp_path / "ckpt" / "gcode").iterdir())) == len(part.layers)
+    with pytest.raises(TypeError):
+        asyncio.run(consume(InjectionPrint(InjectionProcess())))
+
+
+def test_import_budget():
+    import subprocess
+    import sys
+    code = ("import sys, time\n"
+            "t = time.perf_counter()\n"
+            "import altprint.printable.standart, altprint.printable.flex\n"
+            "altprint.printable.standart.StandartProcess()\n"
+            "print(time.perf_counter() - t)\n"
+            "assert 'trimesh' not in sys.modules\n"
+            "assert 'yaml' not in sys.modules\n")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True,
+                            text=True, check=True)
+    assert float(result.stdout) < 1.0
+
+
+def test_gcode_cache(tmp_path):
+    from altprint.gcode import GcodeCache
+    from altprint.printable.standart import StandartPrint, StandartProcess
+    cache = GcodeCache(max_bytes=20000, spill_dir=str(tmp_path / "spill"))
+    process = StandartProcess(model_file="examples/cube/cube.stl",
+                              start_script="scripts/start.gcode",
+                              end_script="scripts/end.gcode",
+                              verbose=False)
+    part = StandartPrint(process)
+    part.slice()
+    part.make_layers()
+    part.export_gcode(tmp_path / "a.gcode")
+    process.gcode_cache = cache
+    part.export_gcode(tmp_path / "b.gcode")
+    assert cache.misses == len(part.layers) and cache.hits == 0
+    part.export_gcode(tmp_path / "c.gcode")
+    assert cache.hits == len(part.layers)
+    assert cache.size <= 20000
+    a = (tmp_path / "a.gcode").read_text()
+    assert a == (tmp_path / "b.gcode").read_text() == (tmp_path / "c.gcode").read_text()
+
+
+def test_speed_profile():
+    from shapely.geometry import LineString, Polygon
+    from altprint.layer import Layer, Raster
+    from altprint.speedprofile import SpeedProfile
+    layer = Layer(None, None, None, None, None)
+    layer.perimeter.append(Raster(LineString([(0, 0), (10, 0), (10, 10), (10.2, 10)]), 1.0, 2400)) # noqa: E501
+    region = Polygon([(5, 4), (15, 4), (15, 15), (5, 15)])
+    SpeedProfile(acceleration=50, min_segment_length=0.5,
+                 short_segment_speed=600).apply(layer, [(region, None, 0.5)])
+    raster = layer.perimeter[0]
+    assert raster.speed[0] == raster.speed[1] < 2400
+    assert raster.speed[3] <= 600
+    assert list(raster.flow[1:]) == [1.0, 0.5, 0.5]
+
+
+def test_simplify_slices(tmp_path):
+    import trimesh
+    from altprint.slicer import STLSlicer
+    from altprint.height_method import StandartHeightMethod
+    trimesh.creation.cylinder(radius=10, height=2, sections=720).export(tmp_path / "c.stl") # noqa: E501
+    slicer = STLSlicer(StandartHeightMethod(), simplify_tolerance=0.01)
+    slicer.load_model(str(tmp_path / "c.stl"))
+    planes = slicer.slice_model()
+    before, after = planes.vertex_count
+    assert after < before / 2
+    for plane in planes.planes.values():
+        assert plane.is_valid and abs(plane.area - 314.159) < 1
+
+
+def test_parallel_export(tmp_path):
+    from altprint.printable.flex import FlexPrint, FlexProcess
+    process = FlexProcess(model_file="examples/flex_bar/bar.stl",
+                          flex_model_file="examples/flex_bar/flex.stl",
+                          start_script="scripts/start.gcode",
+                          end_script="scripts/end.gcode",
+                          verbose=False)
+    part = FlexPrint(process)
+    part.slice()
+    part.make_layers()
+    part.export_gcode(tmp_path / "serial.gcode")
+    process.export_processes = 2
+    part.export_gcode(tmp_path / "parallel.gcode")
+    serial = (tmp_path / "serial.gcode").read_bytes()
+    assert serial == (tmp_path / "parallel.gcode").read_bytes()
+
+    from altprint.gcode import GcodeCache
+    process.gcode_exporter = CommentedExporter
+    process.export_processes = 1
+    part.export_gcode(tmp_path / "serial.gcode")
+    process.export_processes = 2
+    process.gcode_cache = GcodeCache()
+    part.export_gcode(tmp_path / "parallel.gcode")
+    assert process.gcode_cache.misses == len(part.layers)
+    part.export_gcode(tmp_path / "cached.gcode")
+    assert process.gcode_cache.hits == len(part.layers)
+    serial = (tmp_path / "serial.gcode").read_bytes()
+    assert serial.count(b"; commented") > 0
+    assert serial == (tmp_path / "parallel.gcode").read_bytes()
+    assert serial == (tmp_path / "cached.gcode").read_bytes()
+
+
+class CommentedExporter(GcodeExporter):
+
+    def segment(self, x, y, z, e, v) -> str:
+        return "; commented\n" + super().segment(x, y, z, e, v)
+
+
+class LegacyExporter(GcodeExporter):
+
+    def __init__(self, start_script='', end_script=''):
+        super().__init__(start_script, end_script)
+
+
+def test_custom_exporter(tmp_path):
+    from altprint.gcode import GcodeCache
+    from altprint.printable.standart import StandartPrint, StandartProcess
+    process = StandartProcess(model_file="examples/cube/cube.stl",
+                              start_script="scripts/start.gcode",
+                              end_script="scripts/end.gcode",
+                              gcode_exporter=LegacyExporter,
+                              gcode_cache=GcodeCache(), verbose=False)
+    part = StandartPrint(process)
+    part.slice()
+    part.make_layers()
+    part.export_gcode(tmp_path / "legacy.gcode")
+    process.gcode_exporter = CommentedExporter
+    part.export_gcode(tmp_path / "commented.gcode")
+    assert process.gcode_cache.hits == 0
+    assert b"; commented" in (tmp_path / "commented.gcode").read_bytes()
+
+
+
+def test_island_index():
+    from shapely.geometry import Polygon, MultiPolygon
+    from altprint.island import IslandIndex
+    from altprint.layer import Layer
+    from altprint.infill.rectilinear_infill import RectilinearInfill
+    a = Polygon([(0, 0), (10, 0), (10, 10), (0, 10)])
+    b = Polygon([(50, 0), (60, 0), (60, 10), (50, 10)])
+    index = IslandIndex()
+    for height, shape in [(0.2, MultiPolygon([a, b])), (0.4, MultiPolygon([b, a]))]:
+        layer = Layer(shape, 2, 0.5, 0.5, 0.0, height)
+        islands = index.add_layer(height, shape)
+        index.make_paths(layer, islands, RectilinearInfill(), 0.5, 0)
+    assert [island.id for island in index.islands(0.4)] == [1, 0]
+    assert [island.id for island in index.query(0.4, (45, -5, 70, 5))] == [1]
+    assert len(index.track(0)) == 2
+    assert index.hits == 2
+    # the second layer starts on b, where the first one ended
+    assert index.position == (5.0, 5.0)
+
+
+def test_make_layers_twice(tmp_path):
+    import trimesh
+    from altprint.printable.standart import StandartPrint, StandartProcess
+    boxes = [trimesh.creation.box((10, 10, 2)).apply_translation((x, y, 1))
+             for x in (0, 30) for y in (0, 30)]
+    trimesh.util.concatenate(boxes).export(tmp_path / "boxes.stl")
+    process = StandartProcess(model_file=str(tmp_path / "boxes.stl"),
+                              start_script="scripts/start.gcode",
+                              end_script="scripts/end.gcode", verbose=False)
+    part = StandartPrint(process)
+    part.slice()
+    part.make_layers()
+    part.export_gcode(tmp_path / "a.gcode")
+    part.make_layers()
+    part.export_gcode(tmp_path / "b.gcode")
+    assert (tmp_path / "a.gcode").read_text() == (tmp_path / "b.gcode").read_text()
+
+
+
+def test_profiler(tmp_path):
+    from altprint.profiler import SamplingProfiler
+    from altprint.infill.rectilinear_infill import rectilinear_fill
+    from shapely.geometry import Polygon
+    profiler = SamplingProfiler()
+    with profiler.stage("make_layers"):
+        for _ in range(20):
+            rectilinear_fill(Polygon([(0, 0), (50, 0), (50, 50), (0, 50)]), 0.5, 30)
+    profiler.write(str(tmp_path / "profile"))
+    lines = (tmp_path / "profile.collapsed").read_text().splitlines()
+    assert lines and all(line.startswith("make_layers;") for line in lines)
+    assert int(lines[0].rsplit(" ", 1)[1]) > 0
+    times = profiler.stage_times()
+    assert 0 < times["rectilinear_fill"] <= times["make_layers"] + 1e-9
+
+
+@pytest.mark.parametrize("has_qualname", [True, False])
+def test_profiler_methods(monkeypatch, has_qualname):
+    import sys
+    from shapely.geometry import LineString
+    from altprint import profiler
+    from altprint.layer import Raster
+    if has_qualname and sys.version_info < (3, 11):
+        pytest.skip("co_qualname needs Python 3.11")
+    monkeypatch.setattr(profiler, "_HAS_QUALNAME", has_qualname)
+    monkeypatch.setattr(profiler, "_qualnames", {})
+    path = LineString([(i, i % 2) for i in range(20000)])
+    sampler = profiler.SamplingProfiler()
+    with sampler.stage("make_layers"):
+        for _ in range(20):
+            Raster(path, 1.2, 2400)
+    assert sampler.stage_times()["Raster.__init__"] > 0
+
+
+def test_checkpoint_resume(tmp_path):
+    from itertools import islice
+    from altprint.checkpoint import Checkpoint
+    from altprint.printable.flex import FlexPrint, FlexProcess
+
+    def flex_print(**kwargs):
+        process = FlexProcess(model_file="examples/flex_bar/bar.stl",
+                              flex_model_file="examples/flex_bar/flex.stl",
+                              start_script="scripts/start.gcode",
+                              end_script="scripts/end.gcode",
+                              verbose=False, **kwargs)
+        part = FlexPrint(process)
+        part.slice()
+        return part
+
+    reference = flex_print()
+    reference.make_layers()
+    reference.export_gcode(tmp_path / "reference.gcode")
+
+    interrupted = flex_print(checkpoint_dir=str(tmp_path / "ckpt"), checkpoint_every=3)
+    list(islice(interrupted.iter_layers(), 7))
+    assert len(Checkpoint.for_print(interrupted).load()) == 6
+
+    resumed = flex_print(checkpoint_dir=str(tmp_path / "ckpt"), checkpoint_every=3)
+    resumed.make_layers()
+    resumed.export_gcode(tmp_path / "resumed.gcode")
+    expected = (tmp_path / "reference.gcode").read_bytes()
+    assert (tmp_path / "resumed.gcode").read_bytes() == expected
+    assert len(Checkpoint.for_print(resumed).load()) == len(resumed.heights)
+
+    changed = flex_print(checkpoint_dir=str(tmp_path / "ckpt"), raster_gap=0.6)
+    assert Checkpoint.for_print(changed).load() == {}
+
+
+def test_checkpoint_key(tmp_path):
+    from functools import partial
+    from altprint.checkpoint import Checkpoint
+    from altprint.infill.grid_infill import GridInfill
+    from altprint.printable.standart import StandartPrint, StandartProcess
+
+    def cube_print(infill_method):
+        process = StandartProcess(model_file="examples/cube/cube.stl",
+                                  infill_method=infill_method,
+                                  checkpoint_dir=str(tmp_path), verbose=False)
+        part = StandartPrint(process)
+        part.slice()
+        return part
+
+    checkpoint = Checkpoint.for_print(cube_print(partial(GridInfill, density=0.2)))
+    checkpoint.save_layer(0.2, "layer")
+    checkpoint.flush()
+    assert Checkpoint.for_print(cube_print(partial(GridInfill, density=0.2))).load()
+    assert Checkpoint.for_print(cube_print(partial(GridInfill, density=0.9))).load() == {} # noqa: E501
+    with pytest.raises(ValueError):
+        Checkpoint.for_print(cube_print(lambda: GridInfill(0.5)))
+
+
+def test_gcode_reader(tmp_path):
+    import numpy as np
+    from altprint.gcodereader import read_gcode, read_heights
+    from altprint.height_method import CopyHeightsFromFileMethod
+    lines = ["G28\n", "; ALTPRINT layer 0.2\n", "G1 Z0.2 F1200\n",
+             "G1 X1.5 Y-2 E0.1 ; comment\n", "G10\n", "; ALTPRINT layer 0.4\n",
+             "G0 X3 Y4\n", "G1 Z0.4\n"]
+    (tmp_path / "a.gcode").write_text("".join(lines * 500))
+    moves = read_gcode(tmp_path / "a.gcode", chunk_size=1000)
+    assert moves.heights.tolist() == [0.2, 0.4] * 500
+    assert moves.layer.tolist()[:8] == [0, 0, 1, 1, 2, 2, 3, 3]
+    expected = [1.5, -2, np.nan, 0.1, np.nan]
+    assert np.array_equal(moves.moves[1], expected, equal_nan=True)
+    assert moves.positions()[2].tolist() == [3, 4, 0.2, 0.1, 1200]
+    parallel = read_gcode(tmp_path / "a.gcode", chunk_size=1000, processes=3)
+    assert np.array_equal(parallel.moves, moves.moves, equal_nan=True)
+    assert np.array_equal(parallel.layer, moves.layer)
+    method = CopyHeightsFromFileMethod(str(tmp_path / "a.gcode"))
+    assert method.get_heights() == read_heights(tmp_path / "a.gcode")
+    assert method.get_heights() == [0.2, 0.4] * 500
+
+
+GOLDEN_DIR = "golden"
+GOLDEN_EXAMPLES = ["cube", "flex_bar", "batch_flex_bar"]
+GOLDEN_POLYGONS = 8
+
+
+def gcode_moves(text):
+    """x, y, z, e, f columns of every G1 move, nan where a word is missing"""
+    import re
+    import numpy as np
+    rows = []
+    for line in text.splitlines():
+        if line.startswith("G1 "):
+            words = dict(re.findall(r"([XYZEF])(-?[\d.]+)", line))
+            rows.append([float(words.get(k, "nan")) for k in "XYZEF"])
+    return np.array(rows).reshape(-1, 5)
+
+
+def golden_example(name, tmp_dir):
+    """Runs one of the examples and returns its gcode"""
+    import os
+    from altprint.printable.standart import StandartPrint, StandartProcess
+    from altprint.printable.flex import FlexPrint, FlexProcess
+    from altprint.printable.multi import MultiPrint, MultiProcess
+    scripts = {"start_script": "scripts/start.gcode", "end_script": "scripts/end.gcode"} # noqa: E501
+    filename = os.path.join(str(tmp_dir), name + ".gcode")
+    if name == "cube":
+        process = StandartProcess(settings_file="examples/cube/cube.yml")
+        process.model_file = "examples/cube/cube.stl"
+        part = StandartPrint(process)
+    else:
+        settings = ["examples/flex_bar/flex_bar.yml"]
+        if name == "batch_flex_bar":
+            settings = ["examples/batch_flex_bar/flex_bar{}.yml".format(i) for i in (1, 2, 3)] # noqa: E501
+        parts = []
+        for settings_file in settings:
+            process = FlexProcess(settings_file=settings_file)
+            folder = os.path.dirname(settings_file)
+            process.model_file = os.path.join(folder, process.model_file)
+            process.flex_model_file = os.path.join(folder, process.flex_model_file)
+            parts.append(FlexPrint(process))
+        part = parts[0]
+        if name == "batch_flex_bar":
+            for p in parts:
+                p.process.verbose = False
+                p.slice()
+                p.make_layers()
+            part = MultiPrint(MultiProcess(parts=parts, **scripts))
+    part.process.verbose = False
+    for key, value in scripts.items():
+        setattr(part.process, key, value)
+    part.slice()
+    part.make_layers()
+    part.export_gcode(filename)
+    with open(filename) as f:
+        return f.read()
+
+
+def golden_polygon(seed):
+    """Random star shaped polygon with a hole, filled by RectilinearInfill"""
+    import numpy as np
+    from shapely.geometry import Polygon, MultiPolygon
+    from altprint.layer import Layer
+    from altprint.infill.rectilinear_infill import RectilinearInfill
+    rng = np.random.default_rng(seed)
+    n = rng.integers(5, 20)
+    angles = np.sort(rng.uniform(0, 2*np.pi, n))
+    radii = rng.uniform(15, 30, n)
+    shell = np.c_[radii*np.cos(angles), radii*np.sin(angles)] + 50
+    hole = np.c_[5*np.cos(angles), 5*np.sin(angles)] + 50 + rng.uniform(-3, 3, 2)
+    layer = Layer(MultiPolygon([Polygon(shell, [hole])]), 2, 0.5, 0.5, 0.0)
+    layer.make_perimeter()
+    layer.make_infill_border()
+    infill = RectilinearInfill().generate_infill(layer, 0.5, rng.uniform(0, 180))
+    return np.concatenate([np.asarray(path.coords) for path in infill.geoms]
+                          + [np.asarray(path.coords) for path in layer.perimeter_paths.geoms]) # noqa: E501
+
+
+def golden_cases(tmp_dir):
+    for name in GOLDEN_EXAMPLES:
+        yield name, lambda name=name: gcode_moves(golden_example(name, tmp_dir))
+    for seed in range(GOLDEN_POLYGONS):
+        yield "polygon{}".format(seed), lambda seed=seed: golden_polygon(seed)
+
+
+def run_golden_case(run):
+    import time
+    t = time.perf_counter()
+    result = run()
+    return result, time.perf_counter() - t
+
+
+def update_golden(tmp_dir):
+    """Stores the current outputs and timings as the golden references"""
+    import os
+    import numpy as np
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    for name, run in golden_cases(tmp_dir):
+        result, duration = run_golden_case(run)
+        np.savez_compressed(os.path.join(GOLDEN_DIR, name + ".npz"),
+                            result=result, duration=duration)
+
+
+def test_golden(tmp_path, record_property):
+    import os
+    import numpy as np
+    for name, run in golden_cases(tmp_path):
+        reference = np.load(os.path.join(GOLDEN_DIR, name + ".npz"))
+        result, duration = run_golden_case(run)
+        record_property(name + "_duration", duration)
+        record_property(name + "_reference_duration", float(reference["duration"]))
+        assert result.shape == reference["result"].shape, name
+        assert np.allclose(result, reference["result"], atol=1e-3, equal_nan=True), name
+
+
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    if "--update-golden" in sys.argv:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            update_golden(tmp_dir)